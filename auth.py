@@ -3,17 +3,39 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from models import User
-from database import get_session
+from database import get_async_session, get_session
+from cache import LocalCache
+import asyncio
+import os
+import threading
+import time
 
 SECRET_KEY = "secret-key"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "1024"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Resolved users per token; entries never outlive the token's exp claim
+_principal_cache = LocalCache(max_entries=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+_user_generations: dict = {}
+_generations_lock = threading.Lock()
+
+# bcrypt is deliberately slow, so logins get their own small pool instead
+# of competing with every other sync route for the shared threadpool
+_password_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -28,6 +50,18 @@ def authenticate_user(session: Session, username: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(session: Session, username: str, password: str):
+    """authenticate_user run on the bounded password pool, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, authenticate_user, session, username, password
+    )
+
+def invalidate_user(user_id: int):
+    """Drop cached principals for a user, e.g. after a password change"""
+    with _generations_lock:
+        _user_generations[user_id] = _user_generations.get(user_id, 0) + 1
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
     if expires_delta:
@@ -38,20 +72,65 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = session.exec(select(User).where(User.username == username)).first()
+        raise _credentials_exception()
+    return payload
+
+def _cached_principal(token: str):
+    # Signature and expiry are checked on every request; only the user
+    # lookup is cached
+    cached = _principal_cache.get(token)
+    if cached is not None:
+        user, generation = cached
+        if _user_generations.get(user.user_id, 0) == generation:
+            return user
+    return None
+
+def _remember_principal(token: str, payload: dict, user: User, generations: dict):
+    remaining = payload.get("exp", 0) - time.time()
+    if remaining > 0:
+        _principal_cache.set(token, (user, generations.get(user.user_id, 0)), ttl=remaining)
+
+def get_current_user(token: str = Depends(oauth2_scheme), session: Session = Depends(get_session)):
+    payload = _decode_token(token)
+    user = _cached_principal(token)
+    if user is not None:
+        return user
+
+    # Snapshot generations before the lookup so a concurrent invalidation wins
+    generations = dict(_user_generations)
+    user = session.exec(select(User).where(User.username == payload["sub"])).first()
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+    session.expunge(user)
+    _remember_principal(token, payload, user, generations)
+    return user
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_async_session)
+):
+    payload = _decode_token(token)
+    user = _cached_principal(token)
+    if user is not None:
+        return user
+
+    generations = dict(_user_generations)
+    user = (await session.exec(select(User).where(User.username == payload["sub"]))).first()
+    if user is None:
+        raise _credentials_exception()
+    session.expunge(user)
+    _remember_principal(token, payload, user, generations)
+    return user
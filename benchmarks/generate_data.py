@@ -0,0 +1,189 @@
+"""Fill ``customer`` with synthetic leads for benchmarks and local testing.
+
+Categorical values are the ones the model was trained on (the UCI bank
+marketing set), including the 'unknown' levels the imputer handles, with
+roughly the same frequencies. Generation is deterministic for a seed.
+
+    python -m benchmarks.generate_data --rows 1000000
+    python -m benchmarks.generate_data --rows 10000 --database-url sqlite:///bench.db --score
+
+Rows are inserted in chunks through ``ingest.write_customers`` (COPY on
+Postgres), so millions of rows never sit in memory at once.
+"""
+import argparse
+import os
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import numpy as np
+
+CHUNK_SIZE = 50_000
+
+
+def _choice(values: Dict[str, float]):
+    labels = list(values)
+    weights = np.array(list(values.values()), dtype=np.float64)
+    return labels, weights / weights.sum()
+
+
+JOBS = _choice({
+    "admin.": 25.3, "blue-collar": 22.5, "technician": 16.4, "services": 9.6,
+    "management": 7.1, "retired": 4.2, "entrepreneur": 3.5, "self-employed": 3.5,
+    "housemaid": 2.6, "unemployed": 2.5, "student": 2.1, "unknown": 0.8,
+})
+MARITAL = _choice({"married": 60.5, "single": 28.1, "divorced": 11.2, "unknown": 0.2})
+EDUCATION = _choice({
+    "university.degree": 29.5, "high.school": 23.1, "basic.9y": 14.7,
+    "professional.course": 12.7, "basic.4y": 10.1, "basic.6y": 5.6,
+    "unknown": 4.2, "illiterate": 0.1,
+})
+DEFAULT = _choice({"no": 79.1, "unknown": 20.9})
+HOUSING = _choice({"yes": 52.4, "no": 45.2, "unknown": 2.4})
+LOAN = _choice({"no": 82.4, "yes": 15.2, "unknown": 2.4})
+CONTACT = _choice({"cellular": 63.5, "telephone": 36.5})
+MONTHS = _choice({
+    "may": 33.4, "jul": 17.4, "aug": 15.0, "jun": 12.9, "nov": 10.0,
+    "apr": 6.4, "oct": 1.7, "sep": 1.4, "mar": 1.3, "dec": 0.4,
+})
+WEEKDAYS = _choice({"thu": 20.9, "mon": 20.7, "wed": 19.7, "tue": 19.6, "fri": 19.0})
+
+# (emp.var.rate, cons.price.idx, cons.conf.idx, euribor3m, nr.employed)
+# snapshots from the training period, with their frequencies
+ECONOMY = [
+    ((1.4, 93.918, -42.7, 4.961, 5228.1), 16.0),
+    ((1.1, 93.994, -36.4, 4.857, 5191.0), 19.0),
+    ((1.4, 94.465, -41.8, 4.959, 5228.1), 10.0),
+    ((-1.8, 92.893, -46.2, 1.299, 5099.1), 14.0),
+    ((-0.1, 93.2, -42.0, 4.191, 5195.8), 9.0),
+    ((-2.9, 92.963, -40.8, 1.262, 5076.2), 8.0),
+    ((-1.8, 93.075, -47.1, 1.405, 5099.1), 12.0),
+    ((-3.4, 92.649, -30.1, 0.715, 5017.5), 4.0),
+    ((-1.1, 94.199, -37.5, 0.884, 4963.6), 4.0),
+    ((-3.0, 92.713, -33.0, 0.742, 5023.5), 4.0),
+]
+
+FIRST_NAMES = [
+    "Budi", "Siti", "Agus", "Dewi", "Andi", "Rina", "Joko", "Sri", "Ahmad", "Nur",
+    "Eko", "Wati", "Hendra", "Lestari", "Rudi", "Maya", "Dian", "Putri", "Fajar", "Indah",
+]
+LAST_NAMES = [
+    "Santoso", "Wijaya", "Rahma", "Saputra", "Hidayat", "Pratama", "Kurniawan",
+    "Susanto", "Lestari", "Nugroho", "Siregar", "Gunawan", "Halim", "Setiawan",
+]
+
+
+def _pick(rng: np.random.Generator, choice, size: int) -> np.ndarray:
+    labels, weights = choice
+    return np.array(labels, dtype=object)[rng.choice(len(labels), size=size, p=weights)]
+
+
+def generate_chunk(rng: np.random.Generator, size: int) -> List[dict]:
+    """``size`` customer rows as dicts in the Customer field names."""
+    previous = np.where(rng.random(size) < 0.86, 0, rng.integers(1, 7, size))
+    # Only previously contacted leads have a previous outcome / pdays
+    poutcome = np.where(
+        previous == 0, "nonexistent", np.where(rng.random(size) < 0.75, "failure", "success")
+    ).astype(object)
+    pdays = np.where(
+        (previous > 0) & (rng.random(size) < 0.27), rng.integers(0, 28, size), 999
+    )
+    economy_weights = np.array([w for _, w in ECONOMY])
+    economy = np.array([e for e, _ in ECONOMY])[
+        rng.choice(len(ECONOMY), size=size, p=economy_weights / economy_weights.sum())
+    ]
+    first = np.array(FIRST_NAMES, dtype=object)[rng.integers(0, len(FIRST_NAMES), size)]
+    last = np.array(LAST_NAMES, dtype=object)[rng.integers(0, len(LAST_NAMES), size)]
+    phones = rng.integers(10**9, 10**10, size)
+
+    columns = {
+        "name": [f"{f} {l}" for f, l in zip(first, last)],
+        "phone_number": [f"+628{p}" for p in phones],
+        "age": np.clip(rng.normal(40, 10.4, size).round(), 17, 98).astype(int),
+        "job": _pick(rng, JOBS, size),
+        "marital_status": _pick(rng, MARITAL, size),
+        "education": _pick(rng, EDUCATION, size),
+        "has_default_credit": _pick(rng, DEFAULT, size),
+        "has_housing_loan": _pick(rng, HOUSING, size),
+        "has_personal_loan": _pick(rng, LOAN, size),
+        "contact_method": _pick(rng, CONTACT, size),
+        "last_contact_month": _pick(rng, MONTHS, size),
+        "last_contact_weekday": _pick(rng, WEEKDAYS, size),
+        "last_call_duration_sec": np.minimum(rng.exponential(258, size).astype(int), 4918),
+        "current_campaign_contacts": np.minimum(rng.geometric(0.39, size), 56),
+        "days_since_last_campaign": pdays,
+        "previous_campaign_contacts": previous,
+        "previous_campaign_outcome": poutcome,
+        "employment_variation_rate": economy[:, 0],
+        "consumer_price_index": economy[:, 1],
+        "consumer_confidence_index": economy[:, 2],
+        "euribor_3m_rate": economy[:, 3],
+        "number_of_employed": economy[:, 4],
+    }
+    # .tolist() turns NumPy scalars into plain Python values for the driver
+    lists = {name: np.asarray(values).tolist() for name, values in columns.items()}
+    return [dict(zip(lists, values)) for values in zip(*lists.values())]
+
+
+def generate(rows: int, seed: int = 0, score: bool = False, chunk_size: int = CHUNK_SIZE) -> int:
+    """Append ``rows`` synthetic customers; returns the number inserted."""
+    from sqlalchemy import text
+    from sqlmodel import Session
+
+    import summary_cube
+    from cache import bump_dataset_version
+    from database import create_db_and_tables, engine
+    from ingest import write_customers
+    from model_registry import registry
+    from prediction import build_feature_columns, feature_fingerprints, score_feature_columns
+
+    create_db_and_tables()
+    model = registry.get() if score else None
+    rng = np.random.default_rng(seed)
+    inserted = 0
+    with Session(engine) as session:
+        while inserted < rows:
+            size = min(chunk_size, rows - inserted)
+            chunk = generate_chunk(rng, size)
+            if model is not None:
+                columns = build_feature_columns([SimpleNamespace(**row) for row in chunk])
+                scored = zip(
+                    score_feature_columns(model.pipeline, columns, model.compiled),
+                    feature_fingerprints(columns),
+                )
+                for row, (probability, fingerprint) in zip(chunk, scored):
+                    row.update(
+                        subscription_probability=probability,
+                        model_version=model.version,
+                        feature_fingerprint=fingerprint,
+                    )
+            with summary_cube.inserting(session):
+                write_customers(session, chunk)
+                session.commit()
+            inserted += size
+            print(f"  {inserted}/{rows} rows", flush=True)
+        summary_cube.catch_up(session)
+        session.connection().execute(text("ANALYZE customer"))
+        session.commit()
+    bump_dataset_version()
+    return inserted
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--score", action="store_true", help="score rows before insert")
+    args = parser.parse_args(argv)
+    if args.database_url:
+        # database.py reads DATABASE_URL at import time
+        os.environ["DATABASE_URL"] = args.database_url
+
+    started = time.perf_counter()
+    inserted = generate(args.rows, seed=args.seed, score=args.score)
+    print(f"Inserted {inserted} customers in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
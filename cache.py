@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "60"))
+DASHBOARD_CACHE_SIZE = int(os.getenv("DASHBOARD_CACHE_SIZE", "256"))
+
+
+class CacheBackend(ABC):
+    """Interface for dashboard caches.
+
+    Besides plain get/set, a backend owns the dataset version that cache
+    keys embed, so a shared backend (e.g. Redis) can make one scoring run
+    invalidate every API worker at once.
+    """
+
+    @abstractmethod
+    def get(self, key: Hashable) -> Optional[Any]:
+        ...
+
+    @abstractmethod
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def dataset_version(self) -> int:
+        ...
+
+    @abstractmethod
+    def bump_dataset_version(self) -> int:
+        ...
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        value = self.get(key)
+        if value is None:
+            value = factory()
+            self.set(key, value)
+        return value
+
+
+class LocalCache(CacheBackend):
+    """Process-local LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, max_entries: int = DASHBOARD_CACHE_SIZE, ttl: float = DASHBOARD_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def dataset_version(self) -> int:
+        return self._version
+
+    def bump_dataset_version(self) -> int:
+        with self._lock:
+            self._version += 1
+            # Entries keyed by older versions can never be hit again
+            self._entries.clear()
+            return self._version
+
+
+_backend: CacheBackend = LocalCache()
+
+
+def get_cache() -> CacheBackend:
+    return _backend
+
+
+def set_cache(backend: CacheBackend):
+    global _backend
+    _backend = backend
+
+
+def bump_dataset_version() -> int:
+    """Invalidate cached dashboard aggregates after customer data changed."""
+    return _backend.bump_dataset_version()
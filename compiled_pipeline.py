@@ -0,0 +1,211 @@
+"""NumPy re-implementation of the fitted scoring pipeline.
+
+``compile_pipeline`` reads the lookup tables out of the fitted steps once
+(imputer modes, scaler means/scales, one-hot category positions) and
+returns a ``CompiledPipeline`` that turns plain column arrays straight
+into the estimator's feature matrix, with no DataFrame copies in between.
+XGBoost boosters are called through ``inplace_predict``.
+
+Only the step types this project trains are supported; anything else
+raises ``UnsupportedPipeline`` and callers keep using ``predict_proba``.
+"""
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder, StandardScaler
+
+from prediction import CategoricalImputer, FeatureProcessor, ML_FEATURES
+
+logger = logging.getLogger(__name__)
+
+# Largest |compiled - predict_proba| accepted by the load-time self-check
+SELF_CHECK_TOLERANCE = 1e-5
+SELF_CHECK_ROWS = 256
+
+
+class UnsupportedPipeline(ValueError):
+    pass
+
+
+def _apply_feature_processor(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    columns = dict(columns)
+    columns.pop("duration", None)
+    if "pdays" in columns:
+        columns["previously_contacted"] = (columns.pop("pdays") != 999).astype(np.int64)
+    return columns
+
+
+class _Imputer:
+    def __init__(self, mode_values: Dict[str, str]):
+        self.mode_values = dict(mode_values)
+
+    def __call__(self, columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        columns = dict(columns)
+        for col, mode_val in self.mode_values.items():
+            if col in columns:
+                values = columns[col]
+                columns[col] = np.where(values == "unknown", mode_val, values).astype(object)
+        return columns
+
+
+class _Scaler:
+    def __init__(self, scaler: StandardScaler, cols: List[str], offset: int):
+        self.cols = cols
+        self.offset = offset
+        self.mean = scaler.mean_ if scaler.with_mean else np.zeros(len(cols))
+        self.scale = scaler.scale_ if scaler.with_std else np.ones(len(cols))
+
+    def fill(self, matrix: np.ndarray, columns: Dict[str, np.ndarray]):
+        for i, col in enumerate(self.cols):
+            values = np.asarray(columns[col], dtype=np.float64)
+            matrix[:, self.offset + i] = (values - self.mean[i]) / self.scale[i]
+
+
+class _OneHot:
+    def __init__(self, encoder: OneHotEncoder, cols: List[str], offset: int):
+        if getattr(encoder, "_infrequent_enabled", False):
+            raise UnsupportedPipeline("OneHotEncoder with infrequent categories")
+        if encoder.handle_unknown not in ("ignore", "infrequent_if_exist"):
+            raise UnsupportedPipeline(f"OneHotEncoder(handle_unknown={encoder.handle_unknown!r})")
+        self.cols = cols
+        # Per column: category -> absolute output index; a dropped
+        # category (like an unknown one) encodes as all zeros
+        self.lookups = []
+        position = offset
+        drop_idx = encoder.drop_idx_
+        for i, categories in enumerate(encoder.categories_):
+            dropped = None if drop_idx is None else drop_idx[i]
+            lookup = {}
+            for j, category in enumerate(categories):
+                if j == dropped:
+                    continue
+                lookup[category] = position
+                position += 1
+            self.lookups.append(lookup)
+        self.width = position - offset
+
+    def fill(self, matrix: np.ndarray, columns: Dict[str, np.ndarray]):
+        rows = np.arange(matrix.shape[0])
+        for col, lookup in zip(self.cols, self.lookups):
+            # Map the few distinct values, then broadcast back to the rows
+            uniques, inverse = np.unique(np.asarray(columns[col], dtype=str), return_inverse=True)
+            targets = np.array([lookup.get(value, -1) for value in uniques], dtype=np.int64)[inverse]
+            hit = targets >= 0
+            matrix[rows[hit], targets[hit]] = 1.0
+
+
+class CompiledPipeline:
+    def __init__(self, pipeline):
+        *preprocessing, (_, estimator) = pipeline.steps
+        self.column_steps = []
+        self.encoders = []
+        self.width = None
+        for name, step in preprocessing:
+            if isinstance(step, FeatureProcessor):
+                self.column_steps.append(_apply_feature_processor)
+            elif isinstance(step, CategoricalImputer):
+                self.column_steps.append(_Imputer(step.mode_values))
+            elif isinstance(step, ColumnTransformer):
+                if self.encoders:
+                    raise UnsupportedPipeline("more than one ColumnTransformer")
+                self._compile_column_transformer(step)
+            else:
+                raise UnsupportedPipeline(f"step {name!r} ({type(step).__name__})")
+        if self.width is None:
+            raise UnsupportedPipeline("no ColumnTransformer")
+        if getattr(estimator, "n_features_in_", self.width) != self.width:
+            raise UnsupportedPipeline("estimator input width does not match the preprocessor")
+
+        self.estimator = estimator
+        self.booster = None
+        if type(estimator).__name__ == "XGBClassifier" and list(estimator.classes_) == [0, 1]:
+            if estimator.get_params().get("objective") == "binary:logistic":
+                self.booster = estimator.get_booster()
+                try:
+                    self.iteration_range = (0, estimator.best_iteration + 1)
+                except AttributeError:
+                    self.iteration_range = (0, 0)
+
+    def _compile_column_transformer(self, transformer: ColumnTransformer):
+        for name, fitted, cols in transformer.transformers_:
+            output = transformer.output_indices_[name]
+            if output.stop == output.start:
+                continue
+            if isinstance(fitted, StandardScaler):
+                self.encoders.append(_Scaler(fitted, list(cols), output.start))
+            elif isinstance(fitted, OneHotEncoder):
+                encoder = _OneHot(fitted, list(cols), output.start)
+                if encoder.width != output.stop - output.start:
+                    raise UnsupportedPipeline(f"unexpected width for {name!r}")
+                self.encoders.append(encoder)
+            else:
+                raise UnsupportedPipeline(f"transformer {name!r} ({type(fitted).__name__})")
+        self.width = max(
+            (s.stop for s in transformer.output_indices_.values()), default=0
+        )
+
+    def transform(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Feature matrix for raw model columns (ML_FEATURES names)."""
+        for step in self.column_steps:
+            columns = step(columns)
+        rows = len(next(iter(columns.values())))
+        matrix = np.zeros((rows, self.width), dtype=np.float64)
+        for encoder in self.encoders:
+            encoder.fill(matrix, columns)
+        return matrix
+
+    def predict_proba(self, columns: Dict[str, np.ndarray]) -> np.ndarray:
+        """Probability of the positive class, like predict_proba(X)[:, 1]."""
+        matrix = self.transform(columns)
+        if self.booster is not None:
+            return self.booster.inplace_predict(matrix, iteration_range=self.iteration_range)
+        return self.estimator.predict_proba(matrix)[:, 1]
+
+
+def _self_check_columns(compiled: CompiledPipeline, rows: int) -> Dict[str, np.ndarray]:
+    """Synthetic inputs covering every known category plus 'unknown'."""
+    rng = np.random.default_rng(0)
+    columns = {}
+    for encoder in compiled.encoders:
+        if isinstance(encoder, _OneHot):
+            for col, lookup in zip(encoder.cols, encoder.lookups):
+                choices = list(lookup) + ["unknown"]
+                columns[col] = np.array(choices, dtype=object)[rng.integers(0, len(choices), rows)]
+        else:
+            for i, col in enumerate(encoder.cols):
+                columns[col] = encoder.mean[i] + encoder.scale[i] * rng.standard_normal(rows)
+    if "previously_contacted" in columns:
+        del columns["previously_contacted"]
+        columns["pdays"] = rng.choice([999, 3, 6], rows)
+    columns.setdefault("duration", rng.integers(0, 1000, rows))
+    return columns
+
+
+def compile_pipeline(pipeline) -> Optional[CompiledPipeline]:
+    """Compile ``pipeline`` and verify it against predict_proba.
+
+    Returns None (callers fall back to the pandas path) if the pipeline
+    has unsupported steps, fails to compile or the outputs disagree. A
+    fitted search (GridSearchCV etc.) is compiled from its best_estimator_.
+    """
+    try:
+        compiled = CompiledPipeline(getattr(pipeline, "best_estimator_", pipeline))
+        columns = _self_check_columns(compiled, SELF_CHECK_ROWS)
+        expected = pipeline.predict_proba(pd.DataFrame(columns)[ML_FEATURES])[:, 1]
+        actual = compiled.predict_proba(columns)
+    except (UnsupportedPipeline, KeyError) as e:
+        logger.info("Compiled inference disabled: %s", e)
+        return None
+    except Exception:
+        # Anything else is a pipeline shape we did not anticipate; the
+        # predict_proba path still scores it
+        logger.warning("Compiled inference disabled: compiling the pipeline failed", exc_info=True)
+        return None
+    error = float(np.max(np.abs(actual - expected)))
+    if error > SELF_CHECK_TOLERANCE:
+        logger.warning("Compiled inference disabled: differs from predict_proba by %.2e", error)
+        return None
+    return compiled
@@ -1,17 +1,164 @@
 from sqlmodel import create_engine, SQLModel, Session
-from sqlalchemy.engine import URL
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import exc
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from dotenv import load_dotenv
+from metrics import instrument_engine
+from migrations import migration_lock, run_migrations
 import os
+import threading
+import time
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL)
+# ASYNC_DB=1 serves the read routes from an AsyncEngine instead of the threadpool
+ASYNC_DB = os.getenv("ASYNC_DB", "0") == "1"
+
+# Connection pool sizing; applies to both the sync and the async engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+
+# Async drivers for the sync URLs we get configured with
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def _async_url(url: str) -> URL:
+    url = make_url(url)
+    return url.set(drivername=_ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    _async_url(DATABASE_URL) if DATABASE_URL else None
+)
+
+
+class PoolMetrics:
+    """Checkout counters for one engine's pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.checkout_seconds_total = 0.0
+        self.checkout_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+
+    def record(self, seconds: float, waited: bool, timed_out: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_seconds_total += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+            if waited:
+                self.waits += 1
+                self.wait_seconds_total += seconds
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "checkout_seconds_avg": round(
+                    self.checkout_seconds_total / self.checkouts, 6
+                ) if self.checkouts else 0.0,
+                "checkout_seconds_max": round(self.checkout_seconds_max, 6),
+            }
+
+
+class _InstrumentedPool:
+    """Times every checkout; ``waited`` means the pool was exhausted when it started."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        waited = (
+            self.checkedin() == 0
+            and self._max_overflow > -1
+            and self.overflow() >= self._max_overflow
+        )
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.record(time.perf_counter() - started, waited, timed_out)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    metrics = PoolMetrics()
+
+
+class InstrumentedAsyncPool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+
+def _pool_options(url, poolclass) -> dict:
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite keeps its default single-connection pool
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+engine = create_engine(DATABASE_URL, **_pool_options(DATABASE_URL, InstrumentedQueuePool))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL, InstrumentedAsyncPool)
+) if ASYNC_DB else None
+
+instrument_engine(engine)
+if async_engine is not None:
+    instrument_engine(async_engine)
+
+def pool_stats(engine) -> dict:
+    """Current pool occupancy plus the checkout counters since startup"""
+    pool = engine.pool
+    stats = {
+        "pool": pool.__class__.__name__,
+        "size": pool.size() if hasattr(pool, "size") else None,
+        "max_overflow": getattr(pool, "_max_overflow", None),
+        "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+        "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+        "overflow": max(pool.overflow(), 0) if hasattr(pool, "overflow") else None,
+    }
+    metrics = getattr(pool, "metrics", None)
+    stats.update(metrics.snapshot() if metrics is not None else PoolMetrics().snapshot())
+    return stats
 
 def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+    # Workers starting together would otherwise race on create_all and
+    # apply the same migration twice
+    with migration_lock(engine):
+        SQLModel.metadata.create_all(engine)
+        run_migrations(engine)
 
 def get_session():
+    # FastAPI caches dependencies per request, so the route and
+    # get_current_user share this one session
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def get_async_session():
+    async with AsyncSession(async_engine) as session:
+        yield session
@@ -0,0 +1,131 @@
+import csv
+import io
+import os
+from typing import Iterator, List
+
+from sqlalchemy import Column
+from sqlmodel import Session
+
+from database import engine
+from models import Customer
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+EXPORT_COLUMNS = [column.name for column in Customer.__table__.columns]
+
+CSV = "csv"
+PARQUET = "parquet"
+MEDIA_TYPES = {
+    CSV: "text/csv",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+
+def export_columns(names: List[str]) -> List[Column]:
+    """Table columns for ``names``; raises ValueError on an unknown name."""
+    unknown = [name for name in names if name not in EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    return [Customer.__table__.c[name] for name in names]
+
+
+def _batches(query) -> Iterator[list]:
+    # Own session: the request's session is closed once streaming starts.
+    # stream_results gives a server-side cursor on Postgres, so memory
+    # stays at one batch regardless of the export size.
+    with Session(engine) as session:
+        connection = session.connection().execution_options(
+            stream_results=True, yield_per=EXPORT_BATCH_SIZE
+        )
+        for partition in connection.execute(query).partitions():
+            yield partition
+
+
+def _round_probability(value):
+    return None if value is None else round(value, 3)
+
+
+def _rounders(columns: List[Column]) -> list:
+    # Probabilities are shown with 3 decimals everywhere else in the API
+    return [
+        _round_probability if c.name == "subscription_probability" else None
+        for c in columns
+    ]
+
+
+def iter_csv(query, columns: List[Column]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in columns])
+    rounders = _rounders(columns)
+    for batch in _batches(query):
+        for row in batch:
+            writer.writerow(
+                [value if rounder is None else rounder(value) for value, rounder in zip(row, rounders)]
+            )
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _arrow_type(column: Column):
+    import pyarrow as pa
+
+    python_type = column.type.python_type
+    if python_type is int:
+        return pa.int64()
+    if python_type is float:
+        return pa.float64()
+    return pa.string()
+
+
+def iter_parquet(query, columns: List[Column]) -> Iterator[bytes]:
+    """One Parquet row group per fetched batch, streamed as it is written."""
+    # pyarrow is only needed for this export format
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([pa.field(c.name, _arrow_type(c)) for c in columns])
+    rounders = _rounders(columns)
+    sink = _DrainableSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for batch in _batches(query):
+            arrays = []
+            for i, (field, rounder) in enumerate(zip(schema, rounders)):
+                values = [row[i] for row in batch]
+                if rounder is not None:
+                    values = [rounder(v) for v in values]
+                arrays.append(pa.array(values, type=field.type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,141 @@
+"""Distinct filter values with row counts, for the dashboard dropdowns.
+
+``FacetIndex`` keeps the counts in memory, per API worker. The first
+request builds the counts from the summary cube's occupied cells (or
+from ``customer`` when the cube is off) and the age range from the
+``customer.age`` index. After that, a dataset version bump
+only folds in customers above the index's high-water mark, which is an
+id range scan over the new rows. Every ``FACETS_REBUILD_SECONDS`` the
+index is rebuilt in full, to pick up rows changed outside the API.
+"""
+import os
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from sqlalchemy import and_, func, literal, union_all
+from sqlmodel import Session, select
+
+import summary_cube
+from cache import get_cache
+from metrics import query_tag
+from models import Customer, CustomerRollup
+from schemas import FacetsResponse, FacetValue
+
+# Dropdown filters of the dashboard; age is served as a min/max range
+FACET_COLUMNS = ["job", "marital_status", "education"]
+FACETS_REBUILD_SECONDS = float(os.getenv("FACETS_REBUILD_SECONDS", "600"))
+
+
+def _facet_queries(table, count, condition):
+    """(facet, value, count) rows for every facet column"""
+    return union_all(*(
+        select(
+            literal(column).label("facet"),
+            getattr(table, column).label("value"),
+            count.label("count"),
+        )
+        .where(condition)
+        .group_by(getattr(table, column))
+        for column in FACET_COLUMNS
+    ))
+
+
+def _age_range(*conditions):
+    return select(func.min(Customer.age), func.max(Customer.age)).where(*conditions)
+
+
+class FacetIndex:
+    def __init__(self, rebuild_seconds: float = FACETS_REBUILD_SECONDS):
+        self.rebuild_seconds = rebuild_seconds
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Counter] = {}
+        self._min_age: Optional[int] = None
+        self._max_age: Optional[int] = None
+        self._high_water = 0
+        self._built_at: Optional[float] = None
+        self._dataset_version: Optional[int] = None
+        self._response: Optional[FacetsResponse] = None
+
+    def _expired(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at > self.rebuild_seconds
+
+    def get(self, session: Session) -> FacetsResponse:
+        # Read before refreshing, so a bump during the refresh is seen next time
+        version = get_cache().dataset_version()
+        response = self._response
+        if response is not None and version == self._dataset_version and not self._expired():
+            return response
+        with self._lock:
+            if self._expired():
+                self._rebuild(session)
+            elif version != self._dataset_version:
+                self._catch_up(session)
+            self._dataset_version = version
+            return self._response
+
+    def _fold(self, rows, ages):
+        for facet, value, count in rows:
+            # int(): SUM over the cube's BIGINT row_count is Decimal on Postgres
+            self._counts[facet][value] += int(count)
+        min_age, max_age = ages
+        if min_age is not None:
+            self._min_age = min_age if self._min_age is None else min(self._min_age, min_age)
+            self._max_age = max_age if self._max_age is None else max(self._max_age, max_age)
+        self._response = FacetsResponse(
+            **{
+                facet: [
+                    FacetValue(value=value, count=count)
+                    for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+                    if count > 0
+                ]
+                for facet, counts in self._counts.items()
+            },
+            min_age=self._min_age,
+            max_age=self._max_age,
+        )
+
+    def _rebuild(self, session: Session):
+        self._counts = {column: Counter() for column in FACET_COLUMNS}
+        self._min_age = self._max_age = None
+        with Session(session.get_bind()) as snapshot, query_tag("facets.rebuild"):
+            if summary_cube.SUMMARY_CUBE_ENABLED:
+                summary_cube.ensure_fresh(snapshot)
+                # Holding the checkpoint keeps catch-up from moving the cube
+                # between reading the mark and reading the cells
+                high_water = summary_cube.high_water(snapshot, lock=True)
+                values = _facet_queries(
+                    CustomerRollup,
+                    func.sum(CustomerRollup.row_count),
+                    and_(CustomerRollup.dimension == "weekday", CustomerRollup.row_count > 0),
+                )
+            else:
+                high_water = snapshot.exec(select(func.max(Customer.customer_id))).one() or 0
+                values = _facet_queries(Customer, func.count(), Customer.customer_id <= high_water)
+            # Unbounded, so it is two index lookups; rows above the mark
+            # are folded again by _catch_up, which min/max does not mind
+            self._fold(snapshot.exec(values).all(), snapshot.exec(_age_range()).one())
+            snapshot.rollback()
+        self._high_water = high_water
+        self._built_at = time.monotonic()
+
+    def _catch_up(self, session: Session):
+        if summary_cube.SUMMARY_CUBE_ENABLED:
+            # The cube's mark never passes uncommitted ids (see summary_cube.inserting)
+            summary_cube.ensure_fresh(session)
+            high_water = summary_cube.high_water(session)
+        else:
+            high_water = session.exec(select(func.max(Customer.customer_id))).one() or 0
+        if high_water <= self._high_water:
+            return
+        new_rows = and_(Customer.customer_id > self._high_water, Customer.customer_id <= high_water)
+        with query_tag("facets.catch_up"):
+            self._fold(
+                session.exec(_facet_queries(Customer, func.count(), new_rows)).all(),
+                session.exec(_age_range(new_rows)).one(),
+            )
+        self._high_water = high_water
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,213 @@
+import codecs
+import csv
+import io
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+import summary_cube
+from cache import bump_dataset_version
+from model_registry import LoadedModel, registry
+from models import Customer
+from schemas import CustomerCreate
+
+logger = logging.getLogger(__name__)
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+# Only the first rejections are reported back, the rest are just counted
+INGEST_MAX_ERRORS = 100
+
+CSV = "csv"
+NDJSON = "ndjson"
+_FORMATS = {
+    "text/csv": CSV,
+    "application/csv": CSV,
+    "application/x-ndjson": NDJSON,
+    "application/ndjson": NDJSON,
+    "application/jsonl": NDJSON,
+}
+
+INSERT_COLUMNS = list(CustomerCreate.model_fields) + [
+    "subscription_probability",
+    "model_version",
+    "feature_fingerprint",
+]
+
+# COPY ... CSV treats unquoted \N as NULL, so empty strings stay empty
+_COPY_NULL = r"\N"
+_COPY_CUSTOMERS = (
+    f"COPY customer ({', '.join(INSERT_COLUMNS)}) "
+    f"FROM STDIN WITH (FORMAT csv, NULL '{_COPY_NULL}')"
+)
+
+
+@dataclass
+class IngestResult:
+    rows_received: int = 0
+    rows_inserted: int = 0
+    rows_rejected: int = 0
+    rows_scored: int = 0
+    model_version: Optional[str] = None
+    errors: List[dict] = field(default_factory=list)
+
+    def reject(self, line: int, error: str):
+        self.rows_rejected += 1
+        if len(self.errors) < INGEST_MAX_ERRORS:
+            self.errors.append({"line": line, "error": error})
+
+
+def stream_format(content_type: Optional[str]) -> Optional[str]:
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return _FORMATS.get(media_type)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without buffering more than one line."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, object]]:
+    """(line number, raw record) pairs; CSV needs a header line, one record per line."""
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        if fmt == NDJSON:
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, ValueError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        # Empty CSV cells are missing values
+        yield line_no, {name: value if value != "" else None for name, value in zip(header, values)}
+
+
+def _validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+        )
+    return str(error)
+
+
+def _copy_customers(session: Session, rows: List[dict]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(
+            [_COPY_NULL if row.get(name) is None else row[name] for name in INSERT_COLUMNS]
+        )
+    buffer.seek(0)
+    dbapi_connection = session.connection().connection.dbapi_connection
+    with dbapi_connection.cursor() as cursor:
+        cursor.copy_expert(_COPY_CUSTOMERS, buffer)
+
+
+def write_customers(session: Session, rows: List[dict]):
+    """Insert a chunk of customers: COPY on Postgres, one executemany elsewhere."""
+    if session.get_bind().dialect.name == "postgresql":
+        _copy_customers(session, rows)
+    else:
+        session.connection().execute(insert(Customer.__table__), rows)
+
+
+def load_chunk(session: Session, records: list, model: Optional[LoadedModel], result: IngestResult):
+    """Validate, optionally score, and insert one chunk in its own transaction."""
+    leads = []
+    for line_no, record in records:
+        if isinstance(record, Exception):
+            result.reject(line_no, _validation_message(record))
+            continue
+        try:
+            leads.append(CustomerCreate.model_validate(record))
+        except ValidationError as e:
+            result.reject(line_no, _validation_message(e))
+    if not leads:
+        return
+
+    rows = [lead.model_dump() for lead in leads]
+    if model is not None:
+        from prediction import build_feature_columns, feature_fingerprints, score_feature_columns
+
+        columns = build_feature_columns(leads)
+        scored = zip(
+            score_feature_columns(model.pipeline, columns, model.compiled),
+            feature_fingerprints(columns),
+        )
+        for row, (probability, fingerprint) in zip(rows, scored):
+            row["subscription_probability"] = probability
+            row["model_version"] = model.version
+            row["feature_fingerprint"] = fingerprint
+        result.rows_scored += len(rows)
+
+    with summary_cube.inserting(session):
+        write_customers(session, rows)
+        session.commit()
+    bump_dataset_version()
+    result.rows_inserted += len(rows)
+
+
+async def ingest_stream(
+    session: Session,
+    chunks: AsyncIterator[bytes],
+    fmt: str,
+    score: bool = False,
+    chunk_size: int = INGEST_CHUNK_SIZE,
+) -> IngestResult:
+    """Load a streamed CSV/NDJSON body ``chunk_size`` records at a time.
+
+    Parsing stays on the event loop; validation, scoring and the insert
+    run in the threadpool. Each chunk commits on its own, so rows before
+    a failure stay loaded.
+    """
+    result = IngestResult()
+    model = None
+    if score:
+        # One model snapshot for the whole upload; the first call unpickles
+        # it, so keep that off the event loop
+        model = await run_in_threadpool(registry.get)
+        result.model_version = model.version
+
+    records = []
+    async for line_no, record in iter_records(iter_lines(chunks), fmt):
+        result.rows_received += 1
+        records.append((line_no, record))
+        if len(records) >= chunk_size:
+            await run_in_threadpool(load_chunk, session, records, model, result)
+            records = []
+    if records:
+        await run_in_threadpool(load_chunk, session, records, model, result)
+
+    if result.rows_inserted and summary_cube.SUMMARY_CUBE_ENABLED:
+        await run_in_threadpool(summary_cube.catch_up, session)
+    logger.info(
+        "Ingested %d of %d rows (%d rejected, %d scored)",
+        result.rows_inserted, result.rows_received, result.rows_rejected, result.rows_scored,
+    )
+    return result
@@ -0,0 +1,164 @@
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, List, Optional
+
+from sqlalchemy import text
+from sqlmodel import Session
+
+from database import engine
+from model_registry import registry
+
+if TYPE_CHECKING:
+    from parallel_scoring import ShardResult
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the Postgres advisory lock that keeps scoring runs
+# from overlapping across API worker processes.
+SCORING_LOCK_KEY = 7_246_001
+
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class PredictionJob:
+    job_id: str
+    parallel: bool = False
+    rescore: bool = False
+    state: str = PENDING
+    rows_scored: int = 0
+    rows_skipped: int = 0
+    shards: List[dict] = field(default_factory=list)
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=_now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    _started: Optional[float] = field(default=None, repr=False)
+    _elapsed: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def rows_per_second(self) -> Optional[float]:
+        if self._started is None:
+            return None
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return round(self.rows_scored / elapsed, 1) if elapsed > 0 else None
+
+
+def _shard_timing(result: "ShardResult") -> dict:
+    return {
+        "shard": result.shard,
+        "first_customer_id": result.first_customer_id,
+        "last_customer_id": result.last_customer_id,
+        "rows": result.rows,
+        "seconds": round(result.seconds, 3),
+    }
+
+
+@contextmanager
+def _scoring_lock():
+    """Hold a cross-process lock for the duration of a run (Postgres only)."""
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as connection:
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": SCORING_LOCK_KEY}
+        ).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": SCORING_LOCK_KEY}
+                )
+
+
+class PredictionJobManager:
+    """Runs scoring jobs in a background thread, one at a time.
+
+    ``submit`` is single-flight: while a job is pending or running, every
+    caller gets that job back instead of starting another run.
+    """
+
+    def __init__(self, max_history: int = 50):
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-job")
+        self._lock = threading.Lock()
+        self._jobs: "OrderedDict[str, PredictionJob]" = OrderedDict()
+        self._active: Optional[PredictionJob] = None
+
+    def submit(self, parallel: bool = False, rescore: bool = False) -> PredictionJob:
+        with self._lock:
+            if self._active is not None:
+                return self._active
+            job = PredictionJob(job_id=uuid.uuid4().hex, parallel=parallel, rescore=rescore)
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_history:
+                self._jobs.popitem(last=False)
+            self._active = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[PredictionJob]:
+        return self._jobs.get(job_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: PredictionJob):
+        # The scoring modules pull in pandas/scikit-learn; keep them out of
+        # API startup
+        from parallel_scoring import run_parallel_prediction
+        from prediction import run_prediction_and_update_db, run_rescoring
+
+        job.state = RUNNING
+        job.started_at = _now()
+        job._started = time.perf_counter()
+        try:
+            with _scoring_lock() as acquired:
+                if not acquired:
+                    raise RuntimeError("A scoring run is already in progress on another worker")
+                job.model_version = registry.get().version
+                on_progress = lambda rows: setattr(job, "rows_scored", rows)
+                with Session(engine) as session:
+                    if job.rescore:
+                        def on_rescore_progress(scored, skipped):
+                            job.rows_scored, job.rows_skipped = scored, skipped
+
+                        run_rescoring(session, on_progress=on_rescore_progress)
+                    elif job.parallel:
+                        run_parallel_prediction(
+                            session,
+                            on_progress=on_progress,
+                            on_shard=lambda result: job.shards.append(_shard_timing(result)),
+                        )
+                    else:
+                        run_prediction_and_update_db(session, on_progress=on_progress)
+            job.state = SUCCEEDED
+        except Exception as exc:
+            logger.exception("Prediction job %s failed", job.job_id)
+            job.error = str(exc)
+            job.state = FAILED
+        finally:
+            job._elapsed = time.perf_counter() - job._started
+            job.finished_at = _now()
+            with self._lock:
+                self._active = None
+
+
+prediction_jobs = PredictionJobManager()
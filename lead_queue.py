@@ -0,0 +1,155 @@
+"""Hands each sales rep the best lead nobody else is working on.
+
+A claim is a ``LeadClaim`` row with a lease. Claiming is a single
+INSERT ... SELECT ... ON CONFLICT DO UPDATE that walks the ranking of
+leads not yet completed (the partial index ix_customer_open_leads) to
+the first customer without an active claim. Completing a lead sets
+``customer.lead_completed_at``, which drops it from that index, so the
+walk only steps over leads currently held: at most one per sales rep.
+On Postgres the SELECT also takes FOR UPDATE SKIP LOCKED, so concurrent
+claims step past each other's rows instead of waiting. SQLite runs one
+writer at a time, which makes the same statement atomic there. Either
+way the ON CONFLICT clause only takes over a claim whose lease ran out,
+so two reps never hold the same lead.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import and_, delete, desc, exists, literal, nulls_last, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from models import Customer, LeadClaim
+
+LEAD_LEASE_MINUTES = float(os.getenv("LEAD_LEASE_MINUTES", "30"))
+# A claim can lose a race on Postgres after its snapshot was taken; retry
+CLAIM_ATTEMPTS = 3
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _insert(session: Session):
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(LeadClaim.__table__)
+    if dialect_name == "sqlite":
+        return sqlite.insert(LeadClaim.__table__)
+    raise NotImplementedError(f"Lead claims are not supported on {dialect_name}")
+
+
+def _claimable(now: datetime):
+    # Not completed, and never claimed, released, or the lease ran out
+    return and_(
+        Customer.lead_completed_at.is_(None),
+        ~exists().where(
+            LeadClaim.customer_id == Customer.customer_id,
+            LeadClaim.completed_at.is_(None),
+            LeadClaim.lease_expires_at > now,
+        ),
+    )
+
+
+def active_claim(session: Session, user_id: int) -> Optional[LeadClaim]:
+    """The lead ``user_id`` is currently working on, if any."""
+    return session.exec(
+        select(LeadClaim).where(
+            LeadClaim.user_id == user_id,
+            LeadClaim.completed_at.is_(None),
+            LeadClaim.lease_expires_at > _now(),
+        )
+    ).first()
+
+
+def _claim_statement(session: Session, user_id: int, now: datetime):
+    table = LeadClaim.__table__
+    candidate = (
+        select(
+            Customer.customer_id,
+            literal(user_id),
+            literal(now, table.c.claimed_at.type),
+            literal(now + timedelta(minutes=LEAD_LEASE_MINUTES), table.c.lease_expires_at.type),
+        )
+        .where(_claimable(now))
+        .order_by(nulls_last(desc(Customer.subscription_probability)), Customer.customer_id)
+        .limit(1)
+    )
+    if session.get_bind().dialect.name == "postgresql":
+        candidate = candidate.with_for_update(skip_locked=True, of=Customer)
+
+    insert = _insert(session).from_select(
+        ["customer_id", "user_id", "claimed_at", "lease_expires_at"], candidate
+    )
+    return insert.on_conflict_do_update(
+        index_elements=[table.c.customer_id],
+        set_={
+            "user_id": insert.excluded.user_id,
+            "claimed_at": insert.excluded.claimed_at,
+            "lease_expires_at": insert.excluded.lease_expires_at,
+            "completed_at": None,
+            "outcome": None,
+        },
+        where=and_(table.c.completed_at.is_(None), table.c.lease_expires_at <= now),
+    ).returning(table.c.customer_id)
+
+
+def claim_next_lead(session: Session, user_id: int) -> Optional[LeadClaim]:
+    """Claim the highest-probability claimable lead for ``user_id``.
+
+    A rep holding an unexpired claim gets that claim back instead of a
+    new lead. Returns None when every lead is claimed or completed.
+    """
+    current = active_claim(session, user_id)
+    if current is not None:
+        return current
+
+    for _ in range(CLAIM_ATTEMPTS):
+        customer_id = session.connection().execute(
+            _claim_statement(session, user_id, _now())
+        ).scalar_one_or_none()
+        session.commit()
+        if customer_id is not None:
+            return session.get(LeadClaim, customer_id)
+    return None
+
+
+def release_lead(session: Session, user_id: int, customer_id: int) -> bool:
+    """Put a lead the user claimed back in the queue; False if they don't hold it."""
+    result = session.connection().execute(
+        delete(LeadClaim.__table__).where(
+            LeadClaim.customer_id == customer_id,
+            LeadClaim.user_id == user_id,
+            LeadClaim.completed_at.is_(None),
+        )
+    )
+    session.commit()
+    return result.rowcount > 0
+
+
+def complete_lead(
+    session: Session, user_id: int, customer_id: int, outcome: Optional[str] = None
+) -> Optional[LeadClaim]:
+    """Mark a claimed lead as called; it is never handed out again."""
+    now = _now()
+    connection = session.connection()
+    result = connection.execute(
+        update(LeadClaim.__table__)
+        .where(
+            LeadClaim.customer_id == customer_id,
+            LeadClaim.user_id == user_id,
+            LeadClaim.completed_at.is_(None),
+        )
+        .values(completed_at=now, outcome=outcome)
+    )
+    if not result.rowcount:
+        session.rollback()
+        return None
+    connection.execute(
+        update(Customer.__table__)
+        .where(Customer.customer_id == customer_id)
+        .values(lead_completed_at=now)
+    )
+    session.commit()
+    return session.get(LeadClaim, customer_id)
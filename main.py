@@ -1,38 +1,84 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+import time
+
+# Start of the startup timing report: everything from here to on_startup
+# counts as "import"
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlmodel import Session, select
-from sqlalchemy import func, case, and_, or_, desc, nulls_last
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, cast, and_, or_, desc, nulls_last, literal, literal_column, tuple_, union_all, Float, Numeric, REAL
 from sqlalchemy.sql import expression
 from typing import List, Optional, Tuple, Dict
 from datetime import timedelta, datetime
 from sqlalchemy import desc, nulls_last, func
 from math import ceil
+import asyncio
+import base64
+import json
+import orjson
 from schemas import (
     DashboardResponse, 
+    FacetsResponse,
     CustomerItem,
-    ChartsResponse,
-    ProbabilityDistributionItem,
-    JobStatsItem,
-    AgeBinItem,
-    WeekdayItem,
-    MonthItem
+    PredictionJobResponse,
+    PoolStatsResponse,
+    StartupStatsResponse,
+    LeadClaimResponse,
+    LeadCompleteRequest,
+    LeadFeatures,
+    ScoreResponse,
+    BulkIngestResponse,
 )
 
-from models import User, Customer
-from database import engine, get_session, create_db_and_tables
+from models import User, Customer, LeadClaim
+from database import (
+    ASYNC_DB,
+    async_engine,
+    engine,
+    get_async_session,
+    get_session,
+    create_db_and_tables,
+    pool_stats,
+)
+from cache import get_cache
+import summary_cube
 from seed import create_users
 from auth import (
-    authenticate_user,
+    authenticate_user_async,
     create_access_token,
     get_current_user,
+    get_current_user_async,
     ACCESS_TOKEN_EXPIRE_MINUTES,
 )
-from prediction import run_prediction_and_update_db
+from model_registry import registry
+from jobs import prediction_jobs
+from realtime_scoring import score_batcher
+from ingest import ingest_stream, stream_format
+import export
+from facets import facet_index
+import lead_queue
+import metrics
+from metrics import query_tag, stage
+from contextlib import contextmanager
+import logging
 import os
+import threading
+
+logger = logging.getLogger(__name__)
 
 is_dev = os.getenv("ENV") == "development"
 
+# SKIP_DB_INIT=1 when `python migrations.py upgrade` and `python seed.py`
+# run as a release step, so each cold start skips the schema checks
+SKIP_DB_INIT = os.getenv("SKIP_DB_INIT", "0") == "1"
+# background: load the model once the server is up; startup: before
+# serving; off: on first use
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "background")
+
 app = FastAPI(
     title="Lead Scoring Backend API",
     docs_url="/docs" if is_dev else None,
@@ -48,17 +94,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(metrics.RequestLatencyMiddleware)
+
+startup_timings: Dict[str, float] = {}
+
+@contextmanager
+def _startup_step(name: str):
+    started = time.perf_counter()
+    with stage(f"startup.{name}"):
+        yield
+    startup_timings[name] = round(time.perf_counter() - started, 3)
+
+def _warm_up_model():
+    # Imports pandas/scikit-learn/xgboost and unpickles the model, so the
+    # first /predict or /score doesn't pay for it
+    with _startup_step("model_warmup"):
+        try:
+            registry.get()
+        except FileNotFoundError:
+            logger.warning("Model artifact not found in %s, /predict is unavailable", registry.model_dir)
+    logger.info("Model warm-up took %.2fs", startup_timings["model_warmup"])
+
 @app.on_event("startup")
 def on_startup():
-    create_db_and_tables()
-    create_users()  
+    startup_timings["import"] = round(time.perf_counter() - _import_started, 3)
+    if not SKIP_DB_INIT:
+        with _startup_step("db_init"):
+            create_db_and_tables()
+        with _startup_step("seed_users"):
+            create_users()
+    if MODEL_WARMUP == "startup":
+        _warm_up_model()
+    elif MODEL_WARMUP == "background":
+        threading.Thread(target=_warm_up_model, name="model-warmup", daemon=True).start()
+    registry.start_watcher()
+    if metrics.METRICS_PROFILER:
+        metrics.profiler.start()
+    logger.info(
+        "Ready in %.2fs (%s), model warm-up: %s",
+        time.perf_counter() - _import_started,
+        ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items()),
+        MODEL_WARMUP,
+    )
+
+@app.on_event("shutdown")
+def on_shutdown():
+    metrics.profiler.stop()
+    registry.stop_watcher()
+    prediction_jobs.shutdown()
+    score_batcher.shutdown()
 
 @app.post("/token")
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
     session: Session = Depends(get_session)
 ):
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user_async(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -100,7 +191,160 @@ def build_filter_conditions(
         
     return conditions
 
-@app.get("/", response_model=DashboardResponse)
+def _filter_key(
+    name: Optional[str] = None,
+    job: Optional[str] = None,
+    marital_status: Optional[str] = None,
+    education: Optional[str] = None,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None
+) -> tuple:
+    """Canonical cache key for a set of dashboard filters"""
+    def text_key(value, case_insensitive=False):
+        if not value:
+            return None
+        return value.lower() if case_insensitive else value
+
+    return (
+        text_key(name, case_insensitive=True),
+        text_key(job, case_insensitive=True),
+        text_key(marital_status),
+        text_key(education),
+        min_age,
+        max_age,
+    )
+
+def _encode_cursor(probability: Optional[float], customer_id: int) -> str:
+    """Opaque token for the position right after (probability, customer_id)"""
+    raw = json.dumps([probability, customer_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> Tuple[Optional[float], int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        probability, customer_id = json.loads(raw)
+        if probability is not None:
+            probability = float(probability)
+        return probability, int(customer_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _seek_condition(probability: Optional[float], customer_id: int):
+    """Rows after (probability, customer_id) in probability DESC NULLS LAST, customer_id order.
+
+    For a scored position this covers the remaining scored rows only; the
+    leading ``<=`` gives the planner an index range to start from. The
+    unscored tail is fetched separately by _page_query.
+    """
+    if probability is None:
+        return and_(
+            Customer.subscription_probability.is_(None),
+            Customer.customer_id > customer_id
+        )
+    # The column is REAL: compare in REAL, or ties at the page boundary
+    # are dropped or repeated once Postgres widens to float8
+    bound = cast(probability, REAL)
+    return and_(
+        Customer.subscription_probability <= bound,
+        or_(
+            Customer.subscription_probability < bound,
+            Customer.customer_id > customer_id
+        )
+    )
+
+def _count_query(filters: list, cube_filters: Optional[list] = None):
+    if cube_filters is not None:
+        return summary_cube.count_query(cube_filters)
+    count_query = select(func.count()).select_from(Customer)
+    for condition in filters:
+        count_query = count_query.where(condition)
+    return count_query
+
+# Only the CustomerItem fields, with the probability rounded in SQL
+# (numeric round, since Postgres has no round(double precision, int)).
+# The raw probability rides along last for the next cursor.
+_ITEM_FIELDS = tuple(CustomerItem.model_fields)
+_PAGE_COLUMNS = (
+    Customer.customer_id,
+    Customer.name,
+    Customer.phone_number,
+    Customer.age,
+    Customer.contact_method,
+    cast(func.round(cast(Customer.subscription_probability, Numeric), 3), Float).label("subscription_probability"),
+    Customer.subscription_probability.label("raw_probability"),
+)
+
+def _page_query(filters: list, page: int, page_size: int, cursor: Optional[str] = None):
+    base_query = select(*_PAGE_COLUMNS)
+    for condition in filters:
+        base_query = base_query.where(condition)
+
+    ordered_query = base_query.order_by(
+        nulls_last(desc(Customer.subscription_probability)),
+        Customer.customer_id
+    )
+
+    if not cursor:
+        return ordered_query.offset((page - 1) * page_size).limit(page_size)
+
+    # Keyset mode: seek past the last row of the previous page
+    probability, customer_id = _decode_cursor(cursor)
+    seek_query = ordered_query.where(_seek_condition(probability, customer_id)).limit(page_size)
+    if probability is None:
+        return seek_query
+    # The page may run past the last scored row into the unscored tail;
+    # both branches are index seeks of at most page_size rows
+    tail_query = (
+        base_query.where(Customer.subscription_probability.is_(None))
+        .order_by(Customer.customer_id)
+        .limit(page_size)
+    )
+    page_rows = union_all(
+        select(seek_query.subquery()), select(tail_query.subquery())
+    ).subquery()
+    return (
+        select(*page_rows.c)
+        .order_by(nulls_last(desc(page_rows.c.raw_probability)), page_rows.c.customer_id)
+        .limit(page_size)
+    )
+
+def _next_cursor(rows: list, page_size: int) -> Optional[str]:
+    if len(rows) < page_size:
+        return None
+    return _encode_cursor(rows[-1].raw_probability, rows[-1].customer_id)
+
+def _dashboard_response(page: int, page_size: int, total: int, charts: Dict[str, List[Dict]], rows: list) -> Response:
+    # Built straight from the row tuples and chart dicts: the shape is
+    # DashboardResponse, but without a second validation pass
+    total = int(total)
+    payload = {
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "total_pages": ceil(total / page_size) if total > 0 else 1,
+        "charts": charts,
+        "items": [dict(zip(_ITEM_FIELDS, row)) for row in rows],
+        "next_cursor": _next_cursor(rows, page_size),
+    }
+    return Response(orjson.dumps(payload), media_type="application/json")
+
+def _dashboard_filters(name, job, marital_status, education, min_age, max_age):
+    """Base-table filters, summary-cube filters (None if the cube can't answer) and the cache key"""
+    filters = build_filter_conditions(name, job, marital_status, education, min_age, max_age)
+
+    # Facet-only filters can be answered from the summary cube
+    cube_filters = summary_cube.filter_conditions(
+        name, job, marital_status, education, min_age, max_age
+    )
+
+    # Count and charts only change with the filters or the data, so they are
+    # cached per (filters, dataset version) and paging skips them
+    cache_key = (
+        get_cache().dataset_version(),
+        _filter_key(name, job, marital_status, education, min_age, max_age),
+    )
+    return filters, cube_filters, cache_key
+
 def get_dashboard(
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user),
@@ -112,203 +356,215 @@ def get_dashboard(
     max_age: Optional[int] = Query(None),
     page: int = Query(1, ge=1),
     page_size: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
 ):
     # Build shared filter conditions
-    filters = build_filter_conditions(name, job, marital_status, education, min_age, max_age)
+    filters, cube_filters, cache_key = _dashboard_filters(
+        name, job, marital_status, education, min_age, max_age
+    )
+    cache = get_cache()
 
     # Get total count for pagination
-    count_query = select(func.count()).select_from(Customer)
-    for condition in filters:
-        count_query = count_query.where(condition)
-    total = session.exec(count_query).one()
-    total_pages = ceil(total / page_size) if total > 0 else 1
+    def count_customers():
+        if cube_filters is not None:
+            summary_cube.ensure_fresh(session)
+        with query_tag("dashboard.count"):
+            return session.exec(_count_query(filters, cube_filters)).one()
+
+    total = cache.get_or_set(("total", *cache_key), count_customers)
 
     # Get paginated customer records
-    base_query = select(Customer)
-    for condition in filters:
-        base_query = base_query.where(condition)
+    with query_tag("dashboard.page"):
+        rows = session.exec(_page_query(filters, page, page_size, cursor)).all()
 
-    ordered_query = base_query.order_by(
-        nulls_last(desc(Customer.subscription_probability)),
-        Customer.customer_id
+    # Generate chart data from FULL filtered dataset
+    charts = cache.get_or_set(
+        ("charts", *cache_key),
+        lambda: _generate_chart_data(session, filters, cube_filters)
     )
 
-    offset = (page - 1) * page_size
-    customers = session.exec(
-        ordered_query.offset(offset).limit(page_size)
-    ).all()
+    # Construct final response
+    with stage("dashboard.build_response"):
+        return _dashboard_response(page, page_size, total, charts, rows)
 
-    # Generate chart data from FULL filtered dataset
-    charts = _generate_chart_data(session, filters)
-
-    # Convert SQLModel objects to Pydantic models
-    customer_items = [
-        CustomerItem(
-            customer_id=c.customer_id,
-            name=c.name,
-            phone_number=c.phone_number,
-            age=c.age,
-            contact_method=c.contact_method,
-            subscription_probability=round(c.subscription_probability, 3) if c.subscription_probability is not None else None
-        )
-        for c in customers
-    ]
+async def get_dashboard_async(
+    current_user: User = Depends(get_current_user_async),
+    name: Optional[str] = Query(None),
+    job: Optional[str] = Query(None),
+    marital_status: Optional[str] = Query(None),
+    education: Optional[str] = Query(None),
+    min_age: Optional[int] = Query(None),
+    max_age: Optional[int] = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(30, ge=1, le=100),
+    cursor: Optional[str] = Query(None),
+):
+    """get_dashboard on the async engine; count, page and charts run concurrently"""
+    filters, cube_filters, cache_key = _dashboard_filters(
+        name, job, marital_status, education, min_age, max_age
+    )
+    cache = get_cache()
+    total = cache.get(("total", *cache_key))
+    charts = cache.get(("charts", *cache_key))
+
+    if cube_filters is not None and (total is None or charts is None):
+        async with AsyncSession(async_engine) as session:
+            await session.run_sync(summary_cube.ensure_fresh)
+
+    # Each query gets its own session, i.e. its own connection
+    async def fetch_all(statement, tag):
+        async with AsyncSession(async_engine) as session:
+            with query_tag(tag):
+                return (await session.exec(statement)).all()
 
-    # Create chart response with proper Pydantic models
-    charts_response = ChartsResponse(
-        probability_distribution=[
-            ProbabilityDistributionItem(
-                category=item["category"], 
-                count=item["count"]
-            ) for item in charts["probability_distribution"]
-        ],
-        job_stats=[
-            JobStatsItem(
-                job=item["job"],
-                avg_probability=item["avg_probability"]
-            ) for item in charts["job_stats"]
-        ],
-        age_stats=[
-            AgeBinItem(
-                age_bin=item["age_bin"],
-                avg_probability=item["avg_probability"]
-            ) for item in charts["age_stats"]
-        ],
-        weekday_stats=[
-            WeekdayItem(
-                weekday=item["weekday"],
-                avg_probability=item["avg_probability"]
-            ) for item in charts["weekday_stats"]
-        ],
-        seasonal_stats=[
-            MonthItem(
-                month=item["month"],
-                avg_probability=item["avg_probability"]
-            ) for item in charts["seasonal_stats"]
-        ]
+    # Only freshly fetched values are cached; re-setting a hit would
+    # restart its TTL
+    async def fetch_total():
+        async with AsyncSession(async_engine) as session:
+            with query_tag("dashboard.count"):
+                value = (await session.exec(_count_query(filters, cube_filters))).one()
+        cache.set(("total", *cache_key), value)
+        return value
+
+    async def fetch_charts():
+        statement = _chart_data_query(filters, cube_filters, async_engine.dialect.name)
+        value = _rollup_chart_rows(await fetch_all(statement, "dashboard.charts"))
+        cache.set(("charts", *cache_key), value)
+        return value
+
+    rows, total, charts = await asyncio.gather(
+        fetch_all(_page_query(filters, page, page_size, cursor), "dashboard.page"),
+        fetch_total() if total is None else _resolved(total),
+        fetch_charts() if charts is None else _resolved(charts),
     )
 
-    # Construct final response
-    return DashboardResponse(
-        page=page,
-        page_size=page_size,
-        total=total,
-        total_pages=total_pages,
-        charts=charts_response,
-        items=customer_items
+    with stage("dashboard.build_response"):
+        return _dashboard_response(page, page_size, total, charts, rows)
+
+async def _resolved(value):
+    return value
+
+app.add_api_route(
+    "/",
+    get_dashboard_async if ASYNC_DB else get_dashboard,
+    methods=["GET"],
+    response_model=DashboardResponse,
+)
+
+# GROUPING() bits, set when a dimension is aggregated away in a result row;
+# the summary cube's chart_query emits the same ones
+_GROUPED_OUT_JOB = summary_cube.GROUPED_OUT_JOB
+_GROUPED_OUT_AGE = summary_cube.GROUPED_OUT_AGE
+_GROUPED_OUT_WEEKDAY = summary_cube.GROUPED_OUT_WEEKDAY
+_GROUPED_OUT_MONTH = summary_cube.GROUPED_OUT_MONTH
+_GROUPED_OUT_ALL = summary_cube.GROUPED_OUT_ALL
+
+def _chart_query(filters: list, dialect_name: str):
+    """Single-scan aggregate feeding every chart series.
+
+    Postgres computes the overall, per-job, per-age-bin, per-weekday and
+    per-month groups in one pass with GROUPING SETS. Elsewhere the scan is
+    grouped by all four dimensions at once and rolled up in Python.
+    """
+    probability = Customer.subscription_probability
+    ten = literal_column("10")
+    age_bin = (func.floor(Customer.age / ten) * ten).label("age_bin_start")
+    dimensions = (
+        Customer.job,
+        age_bin,
+        Customer.last_contact_weekday,
+        Customer.last_contact_month,
     )
+    measures = summary_cube.probability_measures(probability)
+    chart_conditions = [probability.isnot(None), *filters]
+
+    if dialect_name == "postgresql":
+        group_expressions = (Customer.job, age_bin.element, Customer.last_contact_weekday, Customer.last_contact_month)
+        return (
+            select(*dimensions, func.grouping(*group_expressions).label("grouped_out"), *measures)
+            .where(*chart_conditions)
+            .group_by(func.grouping_sets(*group_expressions, tuple_()))
+        )
+    return (
+        select(*dimensions, literal(0).label("grouped_out"), *measures)
+        .where(*chart_conditions)
+        .group_by(Customer.job, "age_bin_start", Customer.last_contact_weekday, Customer.last_contact_month)
+    )
+
+def _rollup_chart_rows(rows) -> Dict[str, List[Dict]]:
+    """Fold aggregate rows from _chart_query into the five chart series."""
+    high = medium = low = 0
+    jobs: Dict[str, List[float]] = {}
+    ages: Dict[int, List[float]] = {}
+    weekdays: Dict[str, List[float]] = {}
+    months: Dict[str, List[float]] = {}
+
+    def accumulate(series, key, prob_sum, prob_count):
+        totals = series.setdefault(key, [0.0, 0])
+        totals[0] += prob_sum
+        totals[1] += prob_count
+
+    for job, age_start, weekday, month, grouped_out, h, m, l, prob_sum, prob_count in rows:
+        if not prob_count:
+            continue
+        # SUMs can come back as Decimal on Postgres
+        prob_sum = float(prob_sum)
+        prob_count = int(prob_count)
+        if grouped_out in (0, _GROUPED_OUT_ALL):
+            high += int(h or 0)
+            medium += int(m or 0)
+            low += int(l or 0)
+        if not grouped_out & _GROUPED_OUT_JOB:
+            accumulate(jobs, job, prob_sum, prob_count)
+        if not grouped_out & _GROUPED_OUT_AGE and age_start is not None:
+            accumulate(ages, int(age_start), prob_sum, prob_count)
+        if not grouped_out & _GROUPED_OUT_WEEKDAY:
+            accumulate(weekdays, weekday, prob_sum, prob_count)
+        if not grouped_out & _GROUPED_OUT_MONTH:
+            accumulate(months, month, prob_sum, prob_count)
+
+    def average(totals):
+        return round(totals[0] / totals[1], 1)
 
-def _generate_chart_data(session: Session, filters: list) -> Dict[str, List[Dict]]:
-    """Generate all chart data from the full filtered dataset"""
-    # Base conditions for charts (non-null probabilities only)
-    chart_conditions = [
-        Customer.subscription_probability.isnot(None),
-        *filters
-    ]
-    
     # 1. Probability Distribution (Donut Chart)
-    high_count = func.sum(case(
-        (Customer.subscription_probability >= 70, 1),
-        else_=0
-    )).label("high")
-    
-    medium_count = func.sum(case(
-        (and_(
-            Customer.subscription_probability >= 30,
-            Customer.subscription_probability < 70
-        ), 1),
-        else_=0
-    )).label("medium")
-    
-    low_count = func.sum(case(
-        (Customer.subscription_probability < 30, 1),
-        else_=0
-    )).label("low")
-    
-    prob_dist_query = select(high_count, medium_count, low_count).where(*chart_conditions)
-    high, medium, low = session.exec(prob_dist_query).first()
     prob_distribution = [
-        {"category": "High", "count": high or 0},
-        {"category": "Medium", "count": medium or 0},
-        {"category": "Low", "count": low or 0}
+        {"category": "High", "count": high},
+        {"category": "Medium", "count": medium},
+        {"category": "Low", "count": low}
     ]
 
-    # 2. Job Stats (Horizontal Bar Chart) - Top 5 jobs by avg probability
-    job_stats_query = (
-        select(
-            Customer.job,
-            func.avg(Customer.subscription_probability).label("avg_prob"),
-            func.count().label("count")
-        )
-        .where(*chart_conditions)
-        .group_by(Customer.job)
-        .having(func.count() >= 3)  # Minimum 3 records per job
-        .order_by(desc("avg_prob"))
-        .limit(5)
-    )
-    job_results = session.exec(job_stats_query).all()
+    # 2. Job Stats (Horizontal Bar Chart) - Top 5 jobs by avg probability,
+    # minimum 3 records per job
+    top_jobs = sorted(
+        ((job, totals[0] / totals[1]) for job, totals in jobs.items() if totals[1] >= 3),
+        key=lambda item: item[1],
+        reverse=True,
+    )[:5]
     job_stats = [
-        {
-            "job": job,
-            "avg_probability": round(float(avg_prob), 1)
-        }
-        for job, avg_prob, _ in job_results
+        {"job": job, "avg_probability": round(avg_prob, 1)}
+        for job, avg_prob in top_jobs
     ]
 
     # 3. Age Stats (Histogram) - 10-year bins
-    bin_expr = (func.floor(Customer.age / 10) * 10).label("age_bin_start")
-    age_stats_query = (
-        select(
-            bin_expr,
-            func.avg(Customer.subscription_probability).label("avg_prob"),
-            func.count().label("count")
-        )
-        .where(*chart_conditions)
-        .group_by("age_bin_start")
-        .order_by("age_bin_start")
-    )
-    age_results = session.exec(age_stats_query).all()
     age_stats = [
-        {
-            "age_bin": f"{int(start)}-{int(start)+9}",
-            "avg_probability": round(float(avg_prob), 1)
-        }
-        for start, avg_prob, _ in age_results
-        if start is not None and avg_prob is not None
+        {"age_bin": f"{start}-{start+9}", "avg_probability": average(ages[start])}
+        for start in sorted(ages)
     ]
 
     # 4. Weekday Stats (Column Chart) - Chronological order
-    weekday_stats_query = (
-        select(
-            Customer.last_contact_weekday,
-            func.avg(Customer.subscription_probability).label("avg_prob")
-        )
-        .where(*chart_conditions)
-        .group_by(Customer.last_contact_weekday)
-    )
-    weekday_results = {row[0]: round(float(row[1]), 1) for row in session.exec(weekday_stats_query)}
     weekday_stats = [
         {
-            "weekday": day, 
-            "avg_probability": weekday_results.get(day, 0.0)
+            "weekday": day,
+            "avg_probability": average(weekdays[day]) if day in weekdays else 0.0
         }
         for day in WEEKDAY_ORDER
     ]
 
     # 5. Seasonal Stats (Line Chart) - Chronological order
-    seasonal_stats_query = (
-        select(
-            Customer.last_contact_month,
-            func.avg(Customer.subscription_probability).label("avg_prob")
-        )
-        .where(*chart_conditions)
-        .group_by(Customer.last_contact_month)
-    )
-    seasonal_results = {row[0]: round(float(row[1]), 1) for row in session.exec(seasonal_stats_query)}
     seasonal_stats = [
         {
             "month": month,
-            "avg_probability": seasonal_results.get(month, 0.0)
+            "avg_probability": average(months[month]) if month in months else 0.0
         }
         for month in MONTH_ORDER
     ]
@@ -321,7 +577,72 @@ def _generate_chart_data(session: Session, filters: list) -> Dict[str, List[Dict
         "seasonal_stats": seasonal_stats
     }
 
-@app.get("/customers/{customer_id}")
+def _chart_data_query(filters: list, cube_filters: Optional[list], dialect_name: str):
+    if cube_filters is not None:
+        return summary_cube.chart_query(cube_filters)
+    return _chart_query(filters, dialect_name)
+
+def _generate_chart_data(session: Session, filters: list, cube_filters: Optional[list] = None) -> Dict[str, List[Dict]]:
+    """Generate all chart data from the full filtered dataset in one scan.
+
+    When ``cube_filters`` is given the scan runs over the summary cube.
+    """
+    if cube_filters is not None:
+        summary_cube.ensure_fresh(session)
+    query = _chart_data_query(filters, cube_filters, session.get_bind().dialect.name)
+    with query_tag("dashboard.charts"):
+        rows = session.exec(query).all()
+    return _rollup_chart_rows(rows)
+
+# Filter dropdown values with row counts (protected), served from memory
+@app.get("/facets", response_model=FacetsResponse)
+def get_facets(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    return facet_index.get(session)
+
+# Ranked, filtered lead export (protected); declared before /customers/{customer_id}
+@app.get("/customers/export")
+def export_customers(
+    current_user: User = Depends(get_current_user),
+    name: Optional[str] = Query(None),
+    job: Optional[str] = Query(None),
+    marital_status: Optional[str] = Query(None),
+    education: Optional[str] = Query(None),
+    min_age: Optional[int] = Query(None),
+    max_age: Optional[int] = Query(None),
+    export_format: str = Query(export.CSV, alias="format", pattern=f"^({export.CSV}|{export.PARQUET})$"),
+    columns: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    try:
+        selected = export.export_columns(
+            [c.strip() for c in columns.split(",") if c.strip()] if columns else export.EXPORT_COLUMNS
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = select(*selected)
+    for condition in build_filter_conditions(name, job, marital_status, education, min_age, max_age):
+        query = query.where(condition)
+    query = query.order_by(
+        nulls_last(desc(Customer.subscription_probability)),
+        Customer.customer_id
+    )
+    if limit is not None:
+        query = query.limit(limit)
+
+    if export_format == export.PARQUET:
+        body = export.iter_parquet(query, selected)
+    else:
+        body = export.iter_csv(query, selected)
+    return StreamingResponse(
+        body,
+        media_type=export.MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="leads.{export_format}"'},
+    )
+
 def get_customer(
     customer_id: int,
     session: Session = Depends(get_session),
@@ -332,11 +653,162 @@ def get_customer(
         raise HTTPException(status_code=404, detail="Customer not found")
     return customer
 
-# One-time prediction trigger endpoint (protected)
-@app.post("/predict")
+async def get_customer_async(
+    customer_id: int,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(get_current_user_async)
+):
+    customer = await session.get(Customer, customer_id)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return customer
+
+app.add_api_route(
+    "/customers/{customer_id}",
+    get_customer_async if ASYNC_DB else get_customer,
+    methods=["GET"],
+)
+
+# Bulk customer upload (protected), body is streamed CSV or NDJSON
+@app.post("/customers/bulk", response_model=BulkIngestResponse)
+async def ingest_customers(
+    request: Request,
+    score: bool = Query(False),
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user),
+):
+    fmt = stream_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson",
+        )
+    try:
+        result = await ingest_stream(session, request.stream(), fmt, score=score)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Model is not available")
+    return BulkIngestResponse.model_validate(result)
+
+# Prediction trigger endpoint (protected), scoring runs in the background
+@app.post(
+    "/predict",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=PredictionJobResponse,
+)
 def trigger_prediction(
+    parallel: bool = Query(False),
+    rescore: bool = Query(False),
+    current_user: User = Depends(get_current_user),
+):
+    if parallel and rescore:
+        raise HTTPException(status_code=400, detail="Rescoring runs serially; drop parallel")
+    job = prediction_jobs.submit(parallel=parallel, rescore=rescore)
+    return PredictionJobResponse.model_validate(job)
+
+@app.get("/predict/{job_id}", response_model=PredictionJobResponse)
+def get_prediction_job(job_id: str, current_user: User = Depends(get_current_user)):
+    job = prediction_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Prediction job not found")
+    return PredictionJobResponse.model_validate(job)
+
+# Real-time scoring of a single lead (protected), nothing is written to the DB
+@app.post("/score", response_model=ScoreResponse)
+async def score_lead(lead: LeadFeatures, current_user: User = Depends(get_current_user)):
+    try:
+        score = await score_batcher.score(lead)
+    except FileNotFoundError:
+        raise HTTPException(status_code=503, detail="Model is not available")
+    return ScoreResponse(
+        subscription_probability=round(score.subscription_probability, 3),
+        model_version=score.model_version,
+    )
+
+def _lead_claim_response(session: Session, claim: LeadClaim, user: User) -> LeadClaimResponse:
+    customer = session.get(Customer, claim.customer_id)
+    probability = customer.subscription_probability
+    return LeadClaimResponse(
+        customer=CustomerItem(
+            customer_id=customer.customer_id,
+            name=customer.name,
+            phone_number=customer.phone_number,
+            age=customer.age,
+            contact_method=customer.contact_method,
+            subscription_probability=round(probability, 3) if probability is not None else None,
+        ),
+        claimed_by=user.username,
+        claimed_at=claim.claimed_at,
+        lease_expires_at=claim.lease_expires_at,
+        completed_at=claim.completed_at,
+        outcome=claim.outcome,
+    )
+
+# Claim the best lead nobody else is working on (protected)
+@app.post("/leads/next", response_model=LeadClaimResponse)
+def claim_next_lead(
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    claim = lead_queue.claim_next_lead(session, current_user.user_id)
+    if claim is None:
+        raise HTTPException(status_code=404, detail="No unclaimed leads left")
+    return _lead_claim_response(session, claim, current_user)
+
+# Give a claimed lead back to the queue (protected)
+@app.post("/leads/{customer_id}/release", status_code=status.HTTP_204_NO_CONTENT)
+def release_lead(
+    customer_id: int,
+    session: Session = Depends(get_session),
+    current_user: User = Depends(get_current_user)
+):
+    if not lead_queue.release_lead(session, current_user.user_id, customer_id):
+        raise HTTPException(status_code=404, detail="You have no open claim on this lead")
+
+# Mark a claimed lead as called (protected); it is never handed out again
+@app.post("/leads/{customer_id}/complete", response_model=LeadClaimResponse)
+def complete_lead(
+    customer_id: int,
+    body: Optional[LeadCompleteRequest] = None,
     session: Session = Depends(get_session),
     current_user: User = Depends(get_current_user)
 ):
-    run_prediction_and_update_db(session)
-    return {"message": "Prediction completed and database updated."}
\ No newline at end of file
+    claim = lead_queue.complete_lead(
+        session, current_user.user_id, customer_id, body.outcome if body else None
+    )
+    if claim is None:
+        raise HTTPException(status_code=404, detail="You have no open claim on this lead")
+    return _lead_claim_response(session, claim, current_user)
+
+# Connection pool statistics (protected), for sizing DB_POOL_SIZE / DB_MAX_OVERFLOW
+@app.get("/stats/pool", response_model=Dict[str, PoolStatsResponse])
+def get_pool_stats(current_user: User = Depends(get_current_user)):
+    stats = {"sync": pool_stats(engine)}
+    if async_engine is not None:
+        stats["async"] = pool_stats(async_engine)
+    return stats
+
+# Startup timing report (protected): seconds per startup step of this worker
+@app.get("/stats/startup", response_model=StartupStatsResponse)
+def get_startup_stats(current_user: User = Depends(get_current_user)):
+    return StartupStatsResponse(
+        timings=startup_timings,
+        model_warmup=MODEL_WARMUP,
+        model_version=registry.version,
+    )
+
+# Latency histograms and pool gauges in Prometheus text format (protected)
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(current_user: User = Depends(get_current_user)):
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine
+    return PlainTextResponse(
+        metrics.render(engines), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+# Sampled stacks in collapsed format, for flamegraph.pl or speedscope (protected)
+@app.get("/metrics/profile", response_class=PlainTextResponse)
+def get_profile(current_user: User = Depends(get_current_user)):
+    if not metrics.profiler.running:
+        raise HTTPException(status_code=404, detail="Profiler is not enabled (METRICS_PROFILER=1)")
+    return PlainTextResponse(metrics.profiler.collapsed())
@@ -0,0 +1,313 @@
+"""Process-local latency metrics in Prometheus text format.
+
+* ``REQUEST_LATENCY``: per route template, method and status, observed by
+  ``RequestLatencyMiddleware`` until the last body chunk is sent
+* ``QUERY_LATENCY``: every SQL statement on an instrumented engine, keyed
+  by the ``query_tag`` in effect or else a normalized "VERB table" tag
+* ``STAGE_LATENCY``: named ``stage`` blocks in the scoring and dashboard
+  code paths
+* an opt-in sampling profiler (``METRICS_PROFILER=1``) counting the
+  frames threads are in, every ``METRICS_PROFILER_INTERVAL_MS``
+
+Each API worker process keeps its own numbers.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_PROFILER = os.getenv("METRICS_PROFILER", "0") == "1"
+METRICS_PROFILER_INTERVAL_MS = float(os.getenv("METRICS_PROFILER_INTERVAL_MS", "10"))
+# Frames listed on /metrics; the full collapsed stacks are on /metrics/profile
+PROFILE_TOP_FRAMES = 50
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set."""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count], sum
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for label_values, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, label_values, le)} {cumulative}"
+                )
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds", "SQL statement latency by tag", ("tag",)
+)
+STAGE_LATENCY = Histogram(
+    "stage_duration_seconds", "Latency of named code stages", ("stage",)
+)
+
+_query_tag: ContextVar[Optional[str]] = ContextVar("query_tag", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block into STAGE_LATENCY."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, name)
+
+
+@contextmanager
+def query_tag(tag: str):
+    """Label the statements executed inside the block with ``tag``."""
+    token = _query_tag.set(tag)
+    try:
+        yield
+    finally:
+        _query_tag.reset(token)
+
+
+_VERB = re.compile(r"^\s*(?:WITH\b.*?\)\s*)?(\w+)", re.IGNORECASE | re.DOTALL)
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+\"?([A-Za-z_][\w.]*)", re.IGNORECASE)
+
+
+def statement_tag(statement: str) -> str:
+    """"SELECT customer"-style tag: statement verb plus the first table named."""
+    verb = _VERB.match(statement)
+    table = _TABLE.search(statement)
+    return " ".join(
+        part for part in (verb.group(1).upper() if verb else "SQL", table.group(1) if table else "") if part
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_query_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()[1]
+    QUERY_LATENCY.observe(elapsed, _query_tag.get() or statement_tag(statement))
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not fire for a failed statement; drop its
+    # start time so the connection's stack does not grow with every error.
+    # Errors while fetching come after the pop, so match on the context.
+    connection = exception_context.connection
+    context = exception_context.execution_context
+    if connection is None or context is None:
+        return
+    started = connection.info.get("metrics_query_started")
+    if started and started[-1][0] is context:
+        started.pop()
+
+
+def instrument_engine(engine):
+    """Time every statement run through ``engine`` (sync Engine or AsyncEngine)."""
+    if not METRICS_ENABLED:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class RequestLatencyMiddleware:
+    """Plain ASGI middleware timing each HTTP request into REQUEST_LATENCY.
+
+    The clock stops when the app returns, i.e. after the last body chunk of
+    a streamed response, and the status comes from http.response.start.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by the route template so /customers/{customer_id} is one series
+            route = scope.get("route")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - started,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status,
+            )
+
+
+class SamplingProfiler:
+    """Samples every thread's stack on a timer; costs nothing while stopped."""
+
+    def __init__(self, interval: float = METRICS_PROFILER_INTERVAL_MS / 1000):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stacks: Counter = Counter()
+        self._leaves: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                        frame = frame.f_back
+                    if not stack:
+                        continue
+                    self._leaves[stack[0]] += 1
+                    self._stacks[";".join(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in the collapsed format flamegraph.pl / speedscope read."""
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self._stacks.most_common())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            top = self._leaves.most_common(PROFILE_TOP_FRAMES)
+            samples = self.samples
+        lines = [
+            "# HELP profiler_samples_total Sampling ticks taken by the profiler",
+            "# TYPE profiler_samples_total counter",
+            f"profiler_samples_total {samples}",
+            "# HELP profiler_frame_samples_total Samples with the frame on top of a thread's stack",
+            "# TYPE profiler_frame_samples_total counter",
+        ]
+        lines.extend(
+            f'profiler_frame_samples_total{{frame="{_escape(frame)}"}} {count}' for frame, count in top
+        )
+        return lines
+
+
+profiler = SamplingProfiler()
+
+
+def _pool_gauges(engines: Dict[str, object]) -> List[str]:
+    from database import pool_stats
+
+    gauges = {
+        "db_pool_checked_out": ("checked_out", "Connections currently checked out"),
+        "db_pool_overflow": ("overflow", "Overflow connections in use"),
+        "db_pool_checkout_waits_total": ("waits", "Checkouts that found the pool exhausted"),
+        "db_pool_checkout_timeouts_total": ("timeouts", "Checkouts that hit the pool timeout"),
+    }
+    stats = {name: pool_stats(engine) for name, engine in engines.items()}
+    lines = []
+    for metric, (key, help_text) in gauges.items():
+        kind = "counter" if metric.endswith("_total") else "gauge"
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for name, values in stats.items():
+            if values.get(key) is not None:
+                lines.append(f'{metric}{{engine="{name}"}} {values[key]}')
+    return lines
+
+
+def render(engines: Optional[Dict[str, object]] = None) -> str:
+    lines = REQUEST_LATENCY.render() + QUERY_LATENCY.render() + STAGE_LATENCY.render()
+    if engines:
+        lines += _pool_gauges(engines)
+    if profiler.running or profiler.samples:
+        lines += profiler.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,329 @@
+"""Versioned schema migrations for changes ``create_all`` cannot make.
+
+``create_all`` only creates missing tables, so anything that alters an
+existing table (new indexes, new columns, extensions) is a numbered
+migration here. Applied versions are recorded in ``schemamigration``.
+
+    python migrations.py upgrade   # apply pending migrations
+    python migrations.py explain   # show which index each dashboard query uses
+"""
+import argparse
+import logging
+import re
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import Session, select
+
+from models import SchemaMigration
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key serializing schema changes across API workers
+MIGRATION_LOCK_KEY = 7_246_002
+MIGRATION_LOCK_POLL_SECONDS = 1.0
+
+_CONCURRENT_INDEX = re.compile(r"CREATE INDEX CONCURRENTLY IF NOT EXISTS (\w+)", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    # Statements per dialect name; "*" applies to every other dialect
+    statements: Dict[str, List[str]]
+    # Postgres index builds run CONCURRENTLY, which cannot run in a transaction
+    transactional: bool = True
+    # (table, column, type) added before the statements unless already
+    # present, e.g. because create_all built the table from the current model
+    add_columns: Tuple[Tuple[str, str, str], ...] = ()
+
+    def statements_for(self, dialect_name: str) -> List[str]:
+        return self.statements.get(dialect_name, self.statements.get("*", []))
+
+
+_BACKFILL_LEAD_COMPLETED = (
+    "UPDATE customer SET lead_completed_at = ("
+    "SELECT completed_at FROM leadclaim WHERE leadclaim.customer_id = customer.customer_id) "
+    "WHERE customer_id IN (SELECT customer_id FROM leadclaim WHERE completed_at IS NOT NULL)"
+)
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="Indexes for dashboard filters, ranking and scoring",
+        transactional=False,
+        statements={
+            "postgresql": [
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                # name/job filters are ILIKE '%term%', which only trigram GIN can serve
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_name_trgm "
+                "ON customer USING gin (name gin_trgm_ops)",
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_job_trgm "
+                "ON customer USING gin (job gin_trgm_ops)",
+                # Equality facets first, then the age range
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_marital_education_age "
+                "ON customer (marital_status, education, age)",
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_education_age "
+                "ON customer (education, age)",
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_age "
+                "ON customer (age)",
+                # Tables created before the model declared it
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_probability_rank "
+                "ON customer (subscription_probability DESC NULLS LAST, customer_id)",
+                # Backlog scans in prediction.fetch_unscored_chunk
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_unscored "
+                "ON customer (customer_id) WHERE subscription_probability IS NULL",
+                "ANALYZE customer",
+            ],
+            "*": [
+                "CREATE INDEX IF NOT EXISTS ix_customer_marital_education_age "
+                "ON customer (marital_status, education, age)",
+                "CREATE INDEX IF NOT EXISTS ix_customer_education_age "
+                "ON customer (education, age)",
+                "CREATE INDEX IF NOT EXISTS ix_customer_age ON customer (age)",
+                "CREATE INDEX IF NOT EXISTS ix_customer_probability_rank "
+                "ON customer (subscription_probability DESC, customer_id)",
+                "CREATE INDEX IF NOT EXISTS ix_customer_unscored "
+                "ON customer (customer_id) WHERE subscription_probability IS NULL",
+                "ANALYZE customer",
+            ],
+        },
+    ),
+    Migration(
+        version=2,
+        description="Per-customer model version and feature fingerprint for rescoring",
+        add_columns=(
+            ("customer", "model_version", "VARCHAR(32)"),
+            ("customer", "feature_fingerprint", "BIGINT"),
+        ),
+        statements={},
+    ),
+    Migration(
+        version=3,
+        description="Replace the per-age summary cube with the binned customerrollup",
+        statements={
+            "*": [
+                "DROP TABLE IF EXISTS customersummary",
+                # create_all made customerrollup empty; fold it from scratch
+                "DELETE FROM scoringcheckpoint WHERE name = 'summary_cube'",
+            ],
+        },
+    ),
+    Migration(
+        version=4,
+        description="Completed-lead marker on customer and the open-leads index",
+        transactional=False,
+        add_columns=(("customer", "lead_completed_at", "TIMESTAMP WITH TIME ZONE"),),
+        statements={
+            "postgresql": [
+                _BACKFILL_LEAD_COMPLETED,
+                "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_customer_open_leads "
+                "ON customer (subscription_probability DESC NULLS LAST, customer_id) "
+                "WHERE lead_completed_at IS NULL",
+            ],
+            "*": [
+                _BACKFILL_LEAD_COMPLETED,
+                "CREATE INDEX IF NOT EXISTS ix_customer_open_leads "
+                "ON customer (subscription_probability DESC, customer_id) "
+                "WHERE lead_completed_at IS NULL",
+            ],
+        },
+    ),
+]
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """Hold a cross-process lock while changing the schema (Postgres only).
+
+    Waiters poll pg_try_advisory_lock instead of blocking in
+    pg_advisory_lock: a statement blocked on the lock holds a snapshot,
+    and CREATE INDEX CONCURRENTLY in the holder would wait for it.
+    """
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as connection:
+        # No open transaction on this connection while the lock is held
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        while not connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+        ).scalar():
+            time.sleep(MIGRATION_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+
+def applied_versions(engine: Engine) -> set:
+    with Session(engine) as session:
+        return set(session.exec(select(SchemaMigration.version)).all())
+
+
+def _add_missing_columns(engine: Engine, migration: Migration):
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        for table, column, type_ddl in migration.add_columns:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {type_ddl}"))
+
+
+def _drop_invalid_indexes(connection: Connection, statements: List[str]):
+    # A failed CONCURRENTLY build leaves an INVALID index behind, which
+    # IF NOT EXISTS would then skip forever. Under the migration lock
+    # nothing else is building, so any invalid one is such a leftover.
+    names = [match.group(1) for match in map(_CONCURRENT_INDEX.search, statements) if match]
+    if not names:
+        return
+    invalid = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"
+        ),
+        {"names": names},
+    ).scalars().all()
+    for name in invalid:
+        logger.warning("Dropping invalid index %s left by a failed build", name)
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def _apply(engine: Engine, migration: Migration):
+    _add_missing_columns(engine, migration)
+    statements = migration.statements_for(engine.dialect.name)
+    if migration.transactional:
+        with engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+    else:
+        with engine.connect() as connection:
+            connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+            if engine.dialect.name == "postgresql":
+                _drop_invalid_indexes(connection, statements)
+            for statement in statements:
+                connection.execute(text(statement))
+
+    with Session(engine) as session:
+        session.add(SchemaMigration(version=migration.version, description=migration.description))
+        session.commit()
+
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Apply pending migrations in version order; returns the versions applied.
+
+    Run it under ``migration_lock`` when several processes may start at
+    once; the applied versions are read here, after the lock is taken.
+    """
+    done = applied_versions(engine)
+    applied = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done:
+            continue
+        logger.info("Applying migration %d: %s", migration.version, migration.description)
+        _apply(engine, migration)
+        applied.append(migration.version)
+    return applied
+
+
+def _dashboard_queries(dialect_name: str) -> List[Tuple[str, object]]:
+    from sqlalchemy import func
+    from main import (
+        Customer,
+        _chart_query,
+        _encode_cursor,
+        _page_query,
+        build_filter_conditions,
+        desc,
+        nulls_last,
+    )
+
+    def page(filters, *extra):
+        return (
+            select(Customer)
+            .where(*filters, *extra)
+            .order_by(nulls_last(desc(Customer.subscription_probability)), Customer.customer_id)
+            .limit(30)
+        )
+
+    def count(filters):
+        return select(func.count()).select_from(Customer).where(*filters)
+
+    cases = {
+        "unfiltered": build_filter_conditions(),
+        "name search": build_filter_conditions(name="silva"),
+        "job search": build_filter_conditions(job="tech"),
+        "marital + education + age": build_filter_conditions(
+            marital_status="married", education="university.degree", min_age=30, max_age=50
+        ),
+        "age range": build_filter_conditions(min_age=30, max_age=40),
+    }
+    queries = []
+    for label, filters in cases.items():
+        queries.append((f"page: {label}", page(filters)))
+        queries.append((f"count: {label}", count(filters)))
+    queries.append(("page: cursor", _page_query(build_filter_conditions(), 1, 30, _encode_cursor(55.0, 1000))))
+    for label in ("unfiltered", "job search"):
+        queries.append((f"charts: {label}", _chart_query(cases[label], dialect_name)))
+    return queries
+
+
+def _plan_indexes(connection: Connection, statement) -> List[str]:
+    compiled = statement.compile(dialect=connection.dialect)
+    if connection.dialect.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+
+    if connection.dialect.name == "postgresql":
+        plan = connection.exec_driver_sql(
+            "EXPLAIN (FORMAT JSON) " + compiled.string, params
+        ).scalar()
+        found = []
+
+        def walk(node):
+            if "Index Name" in node:
+                found.append(f"{node['Node Type']} using {node['Index Name']}")
+            elif node.get("Node Type") == "Seq Scan":
+                found.append(f"Seq Scan on {node.get('Relation Name')}")
+            for child in node.get("Plans", []):
+                walk(child)
+
+        walk(plan[0]["Plan"])
+        return found
+
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled.string, params).all()
+    return [row[-1] for row in rows if "SCAN" in row[-1] or "SEARCH" in row[-1]]
+
+
+def explain_dashboard_queries(engine: Engine) -> List[Tuple[str, List[str]]]:
+    """Which indexes (or sequential scans) the planner picks per dashboard query."""
+    queries = _dashboard_queries(engine.dialect.name)
+    with engine.connect() as connection:
+        return [(label, _plan_indexes(connection, query)) for label, query in queries]
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["upgrade", "explain"], nargs="?", default="upgrade")
+    args = parser.parse_args()
+
+    if args.command == "upgrade":
+        from sqlmodel import SQLModel
+
+        with migration_lock(engine):
+            SQLModel.metadata.create_all(engine)
+            applied = run_migrations(engine)
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date.")
+    else:
+        for label, plan in explain_dashboard_queries(engine):
+            print(f"{label}:")
+            for step in plan:
+                print(f"    {step}")
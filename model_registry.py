@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv("MODEL_DIR", "pre-trained-model")
+MODEL_FILENAME = "best_model.pkl"
+LABEL_ENCODER_FILENAME = "label_encoder.pkl"
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "30"))
+COMPILED_INFERENCE = os.getenv("COMPILED_INFERENCE", "1") != "0"
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """An unpickled pipeline together with the artifact version it came from."""
+    pipeline: Any
+    label_encoder: Any
+    version: str
+    mtime: float
+    loaded_at: float
+    # NumPy fast path, None when disabled or when its self-check failed
+    compiled: Any = None
+
+
+def _file_signature(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_version(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def _register_pickle_classes():
+    # The pipeline was pickled from a notebook, so its custom transformers
+    # are referenced as __main__.FeatureProcessor / __main__.CategoricalImputer.
+    import __main__
+    from prediction import FeatureProcessor, CategoricalImputer
+
+    setattr(__main__, "FeatureProcessor", FeatureProcessor)
+    setattr(__main__, "CategoricalImputer", CategoricalImputer)
+
+
+class ModelRegistry:
+    """Loads the scoring pipeline once per process and hot-swaps it on change.
+
+    Readers always get a complete ``LoadedModel``; a reload builds the new
+    model off to the side and replaces the reference in one assignment.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, reload_interval: float = MODEL_RELOAD_INTERVAL):
+        self.model_dir = model_dir
+        self.reload_interval = reload_interval
+        self._current: Optional[LoadedModel] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+        self._missing_reported = False
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, MODEL_FILENAME)
+
+    @property
+    def label_encoder_path(self) -> str:
+        return os.path.join(self.model_dir, LABEL_ENCODER_FILENAME)
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current.version if current else None
+
+    def get(self) -> LoadedModel:
+        current = self._current
+        if current is None:
+            with self._load_lock:
+                if self._current is None:
+                    self._load(_file_signature(self.model_path))
+                current = self._current
+        return current
+
+    def reload_if_changed(self) -> bool:
+        """Swap in a changed artifact; a model that was never loaded is left
+        for ``get()`` to load on first use."""
+        if self._current is None:
+            return False
+        signature = _file_signature(self.model_path)
+        if signature == self._signature:
+            return False
+        with self._load_lock:
+            if signature == self._signature:
+                return False
+            self._load(signature)
+        return True
+
+    def _load(self, signature: Tuple[int, int]):
+        import joblib
+
+        _register_pickle_classes()
+        started = time.perf_counter()
+        pipeline = joblib.load(self.model_path)
+        label_encoder = joblib.load(self.label_encoder_path)
+        compiled = None
+        if COMPILED_INFERENCE:
+            from compiled_pipeline import compile_pipeline
+
+            compiled = compile_pipeline(pipeline)
+        model = LoadedModel(
+            pipeline=pipeline,
+            label_encoder=label_encoder,
+            version=_file_version(self.model_path),
+            mtime=signature[0] / 1e9,
+            loaded_at=time.time(),
+            compiled=compiled,
+        )
+        self._current = model
+        self._signature = signature
+        logger.info(
+            "Loaded model %s in %.2fs (compiled inference %s)",
+            model.version, time.perf_counter() - started, "on" if compiled else "off",
+        )
+
+    def start_watcher(self):
+        if self._watcher is not None or self.reload_interval <= 0:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(
+            target=self._watch, name="model-registry-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.reload_interval)
+            self._watcher = None
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            if self._current is None:
+                # Nothing to hot-swap; get() loads (and reports) on first use
+                continue
+            try:
+                self.reload_if_changed()
+                self._missing_reported = False
+            except FileNotFoundError:
+                # Mid-deploy or removed: say so once, not every tick
+                if not self._missing_reported:
+                    logger.warning(
+                        "Model artifact %s is missing, keeping version %s", self.model_path, self.version
+                    )
+                    self._missing_reported = True
+            except Exception:
+                # Keep serving the current model; a half-copied artifact
+                # will be picked up again on the next tick.
+                logger.exception("Model reload failed, keeping version %s", self.version)
+
+
+registry = ModelRegistry()
@@ -1,6 +1,7 @@
 from sqlmodel import SQLModel, Field
 from typing import Optional
-from sqlalchemy import BigInteger, SmallInteger, Float, REAL
+from datetime import datetime, timezone
+from sqlalchemy import BigInteger, Integer, SmallInteger, Float, REAL, Index
 
 class User(SQLModel, table=True):
     user_id: int = Field(default=None, primary_key=True)
@@ -11,7 +12,8 @@ class Customer(SQLModel, table=True):
     customer_id: int = Field(
         default=None,
         primary_key=True,
-        sa_type=BigInteger()
+        # SQLite only autoincrements INTEGER PRIMARY KEY
+        sa_type=BigInteger().with_variant(Integer, "sqlite")
     )
 
     name: str
@@ -48,3 +50,88 @@ class Customer(SQLModel, table=True):
         default=None,
         sa_type=REAL()
     )
+
+    # Which model produced subscription_probability, and a hash of the
+    # inputs it saw; rescoring skips rows where both still match
+    model_version: Optional[str] = Field(default=None, max_length=32)
+    feature_fingerprint: Optional[int] = Field(default=None, sa_type=BigInteger())
+
+    # Set once a sales rep completes the lead; the lead queue never hands it
+    # out again (lead_queue.py)
+    lead_completed_at: Optional[datetime] = None
+
+# Matches the dashboard ranking, so keyset pages are a single index seek.
+# SQLite already sorts NULLs last under DESC and rejects NULLS LAST in indexes.
+Index(
+    "ix_customer_probability_rank",
+    Customer.subscription_probability.desc().nulls_last(),
+    Customer.customer_id,
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_customer_probability_rank",
+    Customer.subscription_probability.desc(),
+    Customer.customer_id,
+).ddl_if(callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != "postgresql")
+
+# The ranking over leads not yet completed, so claiming the next lead
+# never walks past completed ones
+Index(
+    "ix_customer_open_leads",
+    Customer.subscription_probability.desc().nulls_last(),
+    Customer.customer_id,
+    postgresql_where=Customer.lead_completed_at.is_(None),
+).ddl_if(dialect="postgresql")
+Index(
+    "ix_customer_open_leads",
+    Customer.subscription_probability.desc(),
+    Customer.customer_id,
+    sqlite_where=Customer.lead_completed_at.is_(None),
+).ddl_if(callable_=lambda ddl, target, bind, dialect, **kw: dialect.name != "postgresql")
+
+class ScoringCheckpoint(SQLModel, table=True):
+    name: str = Field(primary_key=True)
+    last_customer_id: int = Field(default=0, sa_type=BigInteger())
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class SchemaMigration(SQLModel, table=True):
+    version: int = Field(primary_key=True)
+    description: str
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class CustomerRollup(SQLModel, table=True):
+    """Rollup of customer by the dashboard's filters and chart dimensions.
+
+    Every customer is counted twice: once in its ``dimension="weekday"``
+    cell and once in its ``dimension="month"`` cell (summary_cube.py).
+    """
+    job: str = Field(primary_key=True)
+    marital_status: str = Field(primary_key=True)
+    education: str = Field(primary_key=True)
+    # Start of the 10-year age bin the age chart uses
+    age_bin: int = Field(primary_key=True, sa_type=SmallInteger())
+    dimension: str = Field(primary_key=True, max_length=8)
+    # last_contact_weekday or last_contact_month, per ``dimension``
+    value: str = Field(primary_key=True)
+
+    # All customers in the cell, scored or not
+    row_count: int = Field(default=0, sa_type=BigInteger())
+    # Scored customers by probability bucket, plus sum/count for averages
+    high_count: int = Field(default=0, sa_type=BigInteger())
+    medium_count: int = Field(default=0, sa_type=BigInteger())
+    low_count: int = Field(default=0, sa_type=BigInteger())
+    prob_sum: float = Field(default=0.0, sa_type=Float())
+    prob_count: int = Field(default=0, sa_type=BigInteger())
+
+class LeadClaim(SQLModel, table=True):
+    """A sales rep's hold on a customer from the lead queue (lead_queue.py)"""
+    customer_id: int = Field(
+        primary_key=True,
+        foreign_key="customer.customer_id",
+        sa_type=BigInteger().with_variant(Integer, "sqlite")
+    )
+    user_id: int = Field(foreign_key="user.user_id", index=True)
+    claimed_at: datetime
+    # Past this the lead goes back to the queue unless completed
+    lease_expires_at: datetime
+    completed_at: Optional[datetime] = None
+    outcome: Optional[str] = Field(default=None, max_length=32)
@@ -0,0 +1,141 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from cache import bump_dataset_version
+from database import engine
+from model_registry import registry
+from models import Customer
+from prediction import (
+    SCORING_CHUNK_SIZE,
+    feature_fingerprints,
+    fetch_unscored_chunk,
+    score_feature_columns,
+    write_probabilities,
+)
+
+logger = logging.getLogger(__name__)
+
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "0")) or os.cpu_count() or 1
+
+
+@dataclass
+class ShardResult:
+    shard: int
+    first_customer_id: int
+    last_customer_id: int
+    rows: int = 0
+    seconds: float = 0.0
+    model_version: Optional[str] = None
+
+
+def shard_bounds(session: Session, shards: int) -> List[Tuple[int, int]]:
+    """Split unscored customer_ids into ``shards`` ranges of similar size."""
+    ranked = (
+        select(
+            Customer.customer_id,
+            func.ntile(shards).over(order_by=Customer.customer_id).label("shard"),
+        )
+        .where(Customer.subscription_probability == None)
+        .subquery()
+    )
+    rows = session.exec(
+        select(func.min(ranked.c.customer_id), func.max(ranked.c.customer_id))
+        .group_by(ranked.c.shard)
+        .order_by(ranked.c.shard)
+    ).all()
+    return [(first, last) for first, last in rows]
+
+
+def _init_worker():
+    # Spawned workers import their own engine; unpickle the pipeline once here
+    registry.get()
+
+
+def _score_shard(shard: int, first_id: int, last_id: int, chunk_size: int) -> ShardResult:
+    # Each chunk is written and committed here, so a worker only ever holds
+    # one chunk and a failed shard keeps the chunks it already committed
+    started = time.perf_counter()
+    result = ShardResult(shard=shard, first_customer_id=first_id, last_customer_id=last_id)
+    model = registry.get()
+    result.model_version = model.version
+    after_id = first_id - 1
+    with Session(engine) as session:
+        while True:
+            chunk = fetch_unscored_chunk(session, after_id, chunk_size, upto_id=last_id)
+            if not chunk.customer_ids:
+                break
+            write_probabilities(
+                session,
+                chunk.customer_ids,
+                score_feature_columns(model.pipeline, chunk.columns, model.compiled),
+                feature_fingerprints(chunk.columns),
+                model.version,
+            )
+            session.commit()
+            result.rows += len(chunk.customer_ids)
+            after_id = chunk.customer_ids[-1]
+    result.seconds = time.perf_counter() - started
+    return result
+
+
+def run_parallel_prediction(
+    session: Session,
+    workers: Optional[int] = None,
+    chunk_size: int = SCORING_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int], None]] = None,
+    on_shard: Optional[Callable[[ShardResult], None]] = None,
+) -> int:
+    """Score unscored customers across a process pool, one shard per worker.
+
+    Workers write their scores back in ``chunk_size`` bulk updates and
+    commit each chunk, so memory stays at one chunk per worker and a rerun
+    after a failure only picks up the rows that did not land. A failing
+    shard does not stop the others; its error is raised once they finish.
+    """
+    workers = workers or SCORING_WORKERS
+    bounds = shard_bounds(session, workers)
+    session.rollback()
+    if not bounds:
+        return 0
+
+    scored = 0
+    failure: Optional[BaseException] = None
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=len(bounds), mp_context=context, initializer=_init_worker
+    ) as pool:
+        futures = [
+            pool.submit(_score_shard, shard, first, last, chunk_size)
+            for shard, (first, last) in enumerate(bounds)
+        ]
+        for future in as_completed(futures):
+            # The dashboard cache lives in this process; workers cannot bump it
+            bump_dataset_version()
+            try:
+                result = future.result()
+            except Exception as exc:
+                logger.exception("Scoring shard failed")
+                failure = failure or exc
+                continue
+
+            scored += result.rows
+            logger.info(
+                "Shard %d (%d-%d): %d rows in %.2fs",
+                result.shard, result.first_customer_id, result.last_customer_id,
+                result.rows, result.seconds,
+            )
+            if on_shard is not None:
+                on_shard(result)
+            if on_progress is not None:
+                on_progress(scored)
+    if failure is not None:
+        raise failure
+    return scored
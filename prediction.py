@@ -1,11 +1,22 @@
-import joblib
+import numpy as np
 import pandas as pd
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sqlalchemy import bindparam, text, update
 from sqlmodel import Session, select
-from models import Customer
-import sys
+from models import Customer, ScoringCheckpoint
+from model_registry import registry
+from cache import bump_dataset_version
+import summary_cube
+from metrics import query_tag, stage
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+import os
+
+SCORING_CHUNK_SIZE = int(os.getenv("SCORING_CHUNK_SIZE", "5000"))
+CHECKPOINT_NAME = "unscored"
 
 COLUMN_MAPPING = {
     # Demographics
@@ -120,68 +131,280 @@ final_preprocessor = ColumnTransformer(
     remainder='passthrough'
 )
 
-def run_prediction_and_update_db(session: Session):
-    if '__main__' not in sys.modules:
-        import __main__
-        sys.modules['__main__'] = __main__
-    import __main__
-    setattr(__main__, 'FeatureProcessor', FeatureProcessor)
-    setattr(__main__, 'CategoricalImputer', CategoricalImputer)
-
-    # Load models
-    # preprocessor = joblib.load("pre-trained-model/preprocessor.pkl")
-    pipeline = joblib.load("pre-trained-model/best_model.pkl")
-    label_encoder = joblib.load("pre-trained-model/label_encoder.pkl")
-
-    # Fetch customers without predictions
-    customers = session.exec(select(Customer).where(Customer.subscription_probability == None)).all()
-    if not customers:
-        return
-
-    # Build DataFrame from DB
-    data = []
-    for c in customers:
-        data.append({
-            "age": c.age,
-            "job": c.job,
-            "marital_status": c.marital_status,
-            "education": c.education,
-            "has_default_credit": c.has_default_credit,
-            "has_housing_loan": c.has_housing_loan,
-            "has_personal_loan": c.has_personal_loan,
-            "contact_method": c.contact_method,
-            "last_contact_month": c.last_contact_month,
-            "last_contact_weekday": c.last_contact_weekday,
-            "last_call_duration_sec": c.last_call_duration_sec,
-            "current_campaign_contacts": c.current_campaign_contacts,
-            "days_since_last_campaign": c.days_since_last_campaign,
-            "previous_campaign_contacts": c.previous_campaign_contacts,
-            "previous_campaign_outcome": c.previous_campaign_outcome,
-            "employment_variation_rate": c.employment_variation_rate,
-            "consumer_price_index": c.consumer_price_index,
-            "consumer_confidence_index": c.consumer_confidence_index,
-            "euribor_3m_rate": c.euribor_3m_rate,
-            "number_of_employed": c.number_of_employed,
-        })
-    
-    df_db = pd.DataFrame(data)
-    df_ml = df_db.rename(columns=COLUMN_MAPPING)
-    # df_input = df_ml[ML_FEATURES].copy()
+def _get_checkpoint(session: Session) -> ScoringCheckpoint:
+    checkpoint = session.get(ScoringCheckpoint, CHECKPOINT_NAME)
+    if checkpoint is None:
+        checkpoint = ScoringCheckpoint(name=CHECKPOINT_NAME, last_customer_id=0)
+    return checkpoint
+
+# customer columns the model reads, in COLUMN_MAPPING order
+FEATURE_COLUMNS = [Customer.__table__.c[field] for field in COLUMN_MAPPING]
+
+@dataclass
+class FeatureChunk:
+    """Model inputs for a chunk of customers, one array per ML_FEATURES column.
+
+    ``customer_ids[i]`` is the customer behind row ``i`` of every array.
+    """
+    customer_ids: List[int]
+    columns: Dict[str, np.ndarray]
+    # What each row was last scored with; only fetched for rescoring
+    model_versions: Optional[List[Optional[str]]] = None
+    feature_fingerprints: Optional[List[Optional[int]]] = None
+
+    def take(self, rows: List[int]) -> "FeatureChunk":
+        return FeatureChunk(
+            customer_ids=[self.customer_ids[i] for i in rows],
+            columns={name: values[rows] for name, values in self.columns.items()},
+        )
+
+def _feature_arrays(value_lists) -> Dict[str, np.ndarray]:
+    # Lists of values in COLUMN_MAPPING order -> arrays keyed by model feature
+    return {
+        feature: np.array(values, dtype=object if feature in categorical_cols else np.float64)
+        for feature, values in zip(COLUMN_MAPPING.values(), value_lists)
+    }
+
+def build_feature_columns(customers) -> Dict[str, np.ndarray]:
+    """Model inputs of objects carrying the Customer attributes."""
+    return _feature_arrays(
+        [getattr(c, field) for c in customers] for field in COLUMN_MAPPING
+    )
+
+def feature_fingerprints(columns: Dict[str, np.ndarray]) -> List[int]:
+    """Stable 64-bit hash of each row's model inputs, as signed ints for BIGINT."""
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(columns), index=False)
+    return hashes.to_numpy().view(np.int64).tolist()
+
+_PG_BULK_UPDATE = text(
+    "UPDATE customer SET subscription_probability = data.probability, "
+    "model_version = :model_version, feature_fingerprint = data.fingerprint "
+    "FROM unnest(CAST(:customer_ids AS bigint[]), CAST(:probabilities AS real[]), "
+    "CAST(:fingerprints AS bigint[])) "
+    "AS data(customer_id, probability, fingerprint) "
+    "WHERE customer.customer_id = data.customer_id"
+)
+
+_BULK_UPDATE = (
+    update(Customer.__table__)
+    .where(Customer.__table__.c.customer_id == bindparam("b_customer_id"))
+    .values(
+        subscription_probability=bindparam("b_probability"),
+        model_version=bindparam("b_model_version"),
+        feature_fingerprint=bindparam("b_fingerprint"),
+    )
+)
+
+def write_probabilities(session: Session, customer_ids, probabilities, fingerprints, model_version: str):
+    """Write a chunk of scores in one statement, stamped with model version and fingerprint.
+
+    Postgres joins the chunk in as unnest()ed arrays; other backends
+    (SQLite in tests) fall back to a single executemany.
+    """
+    customer_ids, probabilities = list(customer_ids), list(probabilities)
+    # Reads the old scores, so it has to run before the update
+    summary_cube.record_scores(session, customer_ids, probabilities)
+    connection = session.connection()
+    if connection.dialect.name == "postgresql":
+        connection.execute(
+            _PG_BULK_UPDATE,
+            {
+                "customer_ids": customer_ids,
+                "probabilities": probabilities,
+                "fingerprints": list(fingerprints),
+                "model_version": model_version,
+            },
+        )
+    else:
+        connection.execute(
+            _BULK_UPDATE,
+            [
+                {
+                    "b_customer_id": customer_id,
+                    "b_probability": probability,
+                    "b_fingerprint": fingerprint,
+                    "b_model_version": model_version,
+                }
+                for customer_id, probability, fingerprint in zip(
+                    customer_ids, probabilities, fingerprints
+                )
+            ],
+        )
+
+def fetch_unscored_chunk(
+    session: Session, after_id: int, chunk_size: int, upto_id: Optional[int] = None
+) -> FeatureChunk:
+    """Next ``chunk_size`` unscored customers with customer_id > after_id.
 
-    # for col in ["job", "marital", "education", "default", "housing", "loan", 
-    #             "contact", "month", "day_of_week", "poutcome"]:
-    #     if col in df_input.columns:
-    #         df_input[col] = label_encoder[col].transform(df_input[col])
+    Only customer_id and the feature columns are selected, as plain rows,
+    and transposed straight into column arrays; no ORM objects are built.
+    """
+    query = select(Customer.__table__.c.customer_id, *FEATURE_COLUMNS).where(
+        Customer.subscription_probability == None,
+        Customer.customer_id > after_id,
+    )
+    if upto_id is not None:
+        query = query.where(Customer.customer_id <= upto_id)
+    rows = session.connection().execute(
+        query.order_by(Customer.customer_id).limit(chunk_size)
+    ).all()
+    if not rows:
+        return FeatureChunk(customer_ids=[], columns={})
+    customer_ids, *value_lists = zip(*rows)
+    return FeatureChunk(customer_ids=list(customer_ids), columns=_feature_arrays(value_lists))
 
-    # Predict
-    proba = pipeline.predict_proba(df_ml)[:, 1]
+def fetch_rescore_chunk(session: Session, after_id: int, chunk_size: int) -> FeatureChunk:
+    """Next ``chunk_size`` customers (scored or not) with what they were scored with."""
+    table = Customer.__table__
+    rows = session.connection().execute(
+        select(table.c.customer_id, table.c.model_version, table.c.feature_fingerprint, *FEATURE_COLUMNS)
+        .where(table.c.customer_id > after_id)
+        .order_by(table.c.customer_id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        return FeatureChunk(customer_ids=[], columns={})
+    customer_ids, versions, fingerprints, *value_lists = zip(*rows)
+    return FeatureChunk(
+        customer_ids=list(customer_ids),
+        columns=_feature_arrays(value_lists),
+        model_versions=list(versions),
+        feature_fingerprints=list(fingerprints),
+    )
+
+def score_feature_columns(pipeline, columns: Dict[str, np.ndarray], compiled=None) -> List[float]:
+    """Subscription probabilities (in percent, 3 decimals) for feature arrays.
+
+    ``compiled`` is the model's CompiledPipeline; when given it replaces
+    the DataFrame round trip through ``pipeline``.
+    """
+    if compiled is not None:
+        with stage("score.compiled"):
+            proba = compiled.predict_proba(columns)
+    else:
+        with stage("score.frame"):
+            frame = pd.DataFrame(columns)
+        with stage("score.predict_proba"):
+            proba = pipeline.predict_proba(frame)[:, 1]
     percentages = proba * 100.0
 
-    rounded_percentages = [round(pct, 3) for pct in percentages]
+    return [float(round(pct, 3)) for pct in percentages]
+
+def score_customers(pipeline, customers, compiled=None) -> List[float]:
+    """Subscription probabilities (in percent, 3 decimals) for ``customers``."""
+    return score_feature_columns(pipeline, build_feature_columns(customers), compiled)
+
+def run_prediction_and_update_db(
+    session: Session,
+    chunk_size: int = SCORING_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """Score unscored customers chunk by chunk, committing after each chunk.
+
+    Chunks are read in customer_id order starting after the stored
+    high-water mark, so an interrupted run resumes where it stopped.
+    ``on_progress`` is called with the running total after each commit.
+    Returns the number of customers scored.
+    """
+    # Model is loaded once per process by the registry
+    with stage("predict.load_model"):
+        model = registry.get()
+
+    checkpoint = _get_checkpoint(session)
+    last_id = checkpoint.last_customer_id
+    scored = 0
+    while True:
+        # Fetch the next chunk of customers without predictions
+        with stage("predict.fetch"), query_tag("predict.fetch"):
+            chunk = fetch_unscored_chunk(session, last_id, chunk_size)
+        if not chunk.customer_ids:
+            break
+
+        # Predict
+        with stage("predict.score"):
+            rounded_percentages = score_feature_columns(model.pipeline, chunk.columns, model.compiled)
+
+        # Update DB and advance the high-water mark in the same transaction
+        customer_ids = chunk.customer_ids
+        with stage("predict.write"), query_tag("predict.write"):
+            write_probabilities(
+                session, customer_ids, rounded_percentages,
+                feature_fingerprints(chunk.columns), model.version,
+            )
+            last_id = customer_ids[-1]
+            checkpoint.last_customer_id = last_id
+            checkpoint.updated_at = datetime.now(timezone.utc)
+            session.add(checkpoint)
+            session.flush()
+        with stage("predict.commit"):
+            session.commit()
+        bump_dataset_version()
+
+        scored += len(customer_ids)
+        if on_progress is not None:
+            on_progress(scored)
+
+    # Backlog drained, the next run starts from the beginning again
+    if last_id:
+        session.delete(checkpoint)
+        session.commit()
+    return scored
+
+@dataclass
+class RescoreResult:
+    scored: int = 0
+    skipped: int = 0
+
+def run_rescoring(
+    session: Session,
+    chunk_size: int = SCORING_CHUNK_SIZE,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> RescoreResult:
+    """Rescore customers whose model version or feature fingerprint is stale.
+
+    Every customer is read (feature columns only) and fingerprinted, but
+    only rows scored by another model version, never scored, or whose
+    inputs changed since are predicted and written. An interrupted run
+    can simply be restarted; rows it already rewrote are skipped.
+    ``on_progress`` gets the running (scored, skipped) totals.
+    """
+    with stage("predict.load_model"):
+        model = registry.get()
+    result = RescoreResult()
+    last_id = 0
+    while True:
+        with stage("rescore.fetch"), query_tag("rescore.fetch"):
+            chunk = fetch_rescore_chunk(session, last_id, chunk_size)
+        if not chunk.customer_ids:
+            break
+        last_id = chunk.customer_ids[-1]
+
+        fingerprints = feature_fingerprints(chunk.columns)
+        stale = [
+            i for i, (version, stored, current) in enumerate(
+                zip(chunk.model_versions, chunk.feature_fingerprints, fingerprints)
+            )
+            if version != model.version or stored != current
+        ]
+        result.skipped += len(chunk.customer_ids) - len(stale)
+
+        if stale:
+            rescored = chunk.take(stale)
+            with stage("rescore.score"):
+                probabilities = score_feature_columns(model.pipeline, rescored.columns, model.compiled)
+            with stage("rescore.write"), query_tag("rescore.write"):
+                write_probabilities(
+                    session, rescored.customer_ids, probabilities,
+                    [fingerprints[i] for i in stale], model.version,
+                )
+            with stage("rescore.commit"):
+                session.commit()
+            bump_dataset_version()
+            result.scored += len(stale)
+        else:
+            # Release the read transaction between chunks
+            session.rollback()
 
-    # Update DB
-    for customer, pct in zip(customers, rounded_percentages):
-        customer.subscription_probability = float(pct)
-        session.add(customer)
-    session.commit()
-    
\ No newline at end of file
+        if on_progress is not None:
+            on_progress(result.scored, result.skipped)
+    return result
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from model_registry import registry
+
+logger = logging.getLogger(__name__)
+
+SCORE_BATCH_MAX_SIZE = int(os.getenv("SCORE_BATCH_MAX_SIZE", "64"))
+SCORE_BATCH_MAX_WAIT_MS = float(os.getenv("SCORE_BATCH_MAX_WAIT_MS", "5"))
+
+
+@dataclass(frozen=True)
+class Score:
+    subscription_probability: float
+    model_version: str
+
+
+def _score_batch(leads: list) -> Tuple[List[float], str]:
+    from prediction import score_customers
+
+    # One model snapshot for the whole batch, so every score carries the
+    # version that actually produced it
+    model = registry.get()
+    return score_customers(model.pipeline, leads, model.compiled), model.version
+
+
+class MicroBatcher:
+    """Gathers concurrent score requests into one predict_proba call.
+
+    A batch closes when it reaches ``max_size`` leads or ``max_wait``
+    seconds after its first lead arrived. Inference runs on a single
+    worker thread; requests arriving meanwhile queue up for the next batch.
+    """
+
+    def __init__(
+        self,
+        max_size: int = SCORE_BATCH_MAX_SIZE,
+        max_wait: float = SCORE_BATCH_MAX_WAIT_MS / 1000,
+    ):
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="score-batch")
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def score(self, lead) -> Score:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        self._queue.put_nowait((lead, future))
+        return await future
+
+    async def _collect(self) -> list:
+        batch = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(batch) < self.max_size:
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = [item for item in await self._collect() if not item[1].done()]
+            if not batch:
+                continue
+            try:
+                probabilities, version = await self._loop.run_in_executor(
+                    self._executor, _score_batch, [lead for lead, _ in batch]
+                )
+            except Exception as e:
+                logger.exception("Scoring batch of %d failed", len(batch))
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), probability in zip(batch, probabilities):
+                if not future.done():
+                    future.set_result(Score(probability, version))
+
+    def shutdown(self):
+        if self._worker is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._worker.cancel)
+        self._worker = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+score_batcher = MicroBatcher()
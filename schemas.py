@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+from datetime import datetime
 
 class CustomerItem(BaseModel):
     customer_id: int
@@ -39,6 +40,17 @@ class ChartsResponse(BaseModel):
     weekday_stats: List[WeekdayItem]
     seasonal_stats: List[MonthItem]
 
+class FacetValue(BaseModel):
+    value: str
+    count: int
+
+class FacetsResponse(BaseModel):
+    job: List[FacetValue]
+    marital_status: List[FacetValue]
+    education: List[FacetValue]
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+
 class DashboardResponse(BaseModel):
     page: int
     page_size: int
@@ -46,6 +58,108 @@ class DashboardResponse(BaseModel):
     total_pages: int
     charts: ChartsResponse
     items: List[CustomerItem]
+    next_cursor: Optional[str] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ShardTimingItem(BaseModel):
+    shard: int
+    first_customer_id: int
+    last_customer_id: int
+    rows: int
+    seconds: float
+
+class PredictionJobResponse(BaseModel):
+    job_id: str
+    parallel: bool = False
+    rescore: bool = False
+    state: str
+    rows_scored: int
+    rows_skipped: int = 0
+    shards: List[ShardTimingItem] = []
+    rows_per_second: Optional[float] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class PoolStatsResponse(BaseModel):
+    pool: str
+    size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow: Optional[int] = None
+    checkouts: int
+    waits: int
+    timeouts: int
+    wait_seconds_total: float
+    checkout_seconds_avg: float
+    checkout_seconds_max: float
+
+class StartupStatsResponse(BaseModel):
+    timings: Dict[str, float]
+    model_warmup: str
+    model_version: Optional[str] = None
+
+class LeadFeatures(BaseModel):
+    """Model inputs in the Customer field names"""
+    age: int
+    job: str
+    marital_status: str
+    education: str
+    has_default_credit: str
+    has_housing_loan: str
+    has_personal_loan: str
+    contact_method: str
+    last_contact_month: str
+    last_contact_weekday: str
+    last_call_duration_sec: int
+    current_campaign_contacts: int
+    days_since_last_campaign: int
+    previous_campaign_contacts: int
+    previous_campaign_outcome: str
+    employment_variation_rate: Optional[float] = None
+    consumer_price_index: Optional[float] = None
+    consumer_confidence_index: Optional[float] = None
+    euribor_3m_rate: Optional[float] = None
+    number_of_employed: Optional[float] = None
+
+class ScoreResponse(BaseModel):
+    subscription_probability: float
+    model_version: str
+
+class CustomerCreate(LeadFeatures):
+    name: str
+    phone_number: str
+
+class BulkIngestError(BaseModel):
+    line: int
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    rows_received: int
+    rows_inserted: int
+    rows_rejected: int
+    rows_scored: int
+    model_version: Optional[str] = None
+    errors: List[BulkIngestError]
+
+    class Config:
+        from_attributes = True
+
+class LeadClaimResponse(BaseModel):
+    customer: CustomerItem
+    claimed_by: str
+    claimed_at: datetime
+    lease_expires_at: datetime
+    completed_at: Optional[datetime] = None
+    outcome: Optional[str] = None
+
+class LeadCompleteRequest(BaseModel):
+    outcome: Optional[str] = Field(default=None, max_length=32)
@@ -0,0 +1,409 @@
+"""Pre-aggregated rollup of ``customer`` for dashboard counts and charts.
+
+``customerrollup`` is keyed by the dashboard filters (job, marital_status,
+education) and the 10-year age bin of the age chart. Each customer is
+counted in one ``weekday`` cell and one ``month`` cell, so the weekday and
+month charts are sums over their own cells. Every other aggregate reads
+the weekday cells. The key is bounded by the distinct values, not by the
+row count, so the rollup stays a few thousand cells while ``customer``
+grows. Dashboard queries without a ``name`` search, and with age bounds on
+bin edges, read it instead of scanning ``customer``.
+
+The rollup is maintained incrementally:
+
+* new customers (customer_id above the high-water mark) are folded in by
+  ``catch_up``, which the read path calls when it sees new ids;
+* ``record_scores`` folds a probability write-back into the cells as a
+  single delta upsert, before the write;
+* ``inserting`` wraps API inserts so catch-up never skips ids that are
+  still uncommitted.
+
+Writers share the checkpoint row lock and only ``catch_up`` takes it
+exclusively, so concurrent scoring writers do not wait on each other.
+Scores written while ``SUMMARY_CUBE_ENABLED=0`` mark the rollup stale,
+and the next catch-up after it is re-enabled rebuilds it. Rows changed or
+deleted outside the API are not tracked; run
+``python summary_cube.py rebuild`` after such loads.
+"""
+import os
+import struct
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Float, SmallInteger, and_, case, cast, delete, func, literal, literal_column, null, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from models import Customer, CustomerRollup, ScoringCheckpoint
+
+SUMMARY_CUBE_ENABLED = os.getenv("SUMMARY_CUBE_ENABLED", "1") != "0"
+CHECKPOINT_NAME = "summary_cube"
+# Checkpoint value meaning the cells must be rebuilt before use
+STALE = -1
+
+AGE_BIN = 10
+KEY = ["job", "marital_status", "education", "age_bin", "dimension", "value"]
+MEASURES = ["row_count", "high_count", "medium_count", "low_count", "prob_sum", "prob_count"]
+# dimension -> the customer column its cells are keyed by
+DIMENSIONS = {"weekday": "last_contact_weekday", "month": "last_contact_month"}
+
+# GROUPING() bits over (job, age bin, weekday, month), as Postgres sets them
+# for main._chart_query's grouping sets
+GROUPED_OUT_JOB = 8
+GROUPED_OUT_AGE = 4
+GROUPED_OUT_WEEKDAY = 2
+GROUPED_OUT_MONTH = 1
+GROUPED_OUT_ALL = 15
+
+
+def probability_measures(probability):
+    """Bucket counts and sum/count of a probability column, as aggregates"""
+    return (
+        func.sum(case((probability >= 70, 1), else_=0)).label("high"),
+        func.sum(case((and_(probability >= 30, probability < 70), 1), else_=0)).label("medium"),
+        func.sum(case((probability < 30, 1), else_=0)).label("low"),
+        func.sum(cast(probability, Float)).label("prob_sum"),
+        func.count(probability).label("prob_count"),
+    )
+
+
+def _score_measures(probability: Optional[float]) -> tuple:
+    """One customer's contribution to (high, medium, low, prob_sum, prob_count)"""
+    if probability is None:
+        return 0, 0, 0, 0.0, 0
+    return (
+        int(probability >= 70),
+        int(30 <= probability < 70),
+        int(probability < 30),
+        probability,
+        1,
+    )
+
+
+def _insert(session: Session):
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(CustomerRollup.__table__)
+    if dialect_name == "sqlite":
+        return sqlite.insert(CustomerRollup.__table__)
+    raise NotImplementedError(f"Summary cube upserts are not supported on {dialect_name}")
+
+
+def _upsert(stmt):
+    """Add the inserted measures onto existing cells"""
+    table = CustomerRollup.__table__
+    return stmt.on_conflict_do_update(
+        index_elements=KEY,
+        set_={name: table.c[name] + stmt.excluded[name] for name in MEASURES},
+    )
+
+
+def _age_bin(age):
+    ten = literal_column(str(AGE_BIN))
+    return cast(func.floor(age / ten) * ten, SmallInteger)
+
+
+def _merge_from_customers(session: Session, condition):
+    """Add the aggregate of matching customers to their cells."""
+    age_bin = _age_bin(Customer.age)
+    for dimension, column in DIMENSIONS.items():
+        value = getattr(Customer, column)
+        group = (Customer.job, Customer.marital_status, Customer.education, age_bin, value)
+        aggregate = (
+            select(
+                *group[:4],
+                literal(dimension),
+                value,
+                func.count(),
+                *(
+                    func.coalesce(measure.element, 0)
+                    for measure in probability_measures(Customer.subscription_probability)
+                ),
+            )
+            .where(condition)
+            .group_by(*group)
+        )
+        session.connection().execute(_upsert(_insert(session).from_select(KEY + MEASURES, aggregate)))
+
+
+def _lock_checkpoint(session: Session, shared: bool = False) -> ScoringCheckpoint:
+    # Writers take the row FOR SHARE and catch-up FOR UPDATE, so catch-up
+    # never folds rows a writer is still changing, and writers run in parallel
+    checkpoint = session.exec(
+        select(ScoringCheckpoint)
+        .where(ScoringCheckpoint.name == CHECKPOINT_NAME)
+        .with_for_update(read=shared)
+    ).first()
+    if checkpoint is None:
+        checkpoint = ScoringCheckpoint(name=CHECKPOINT_NAME, last_customer_id=0)
+    return checkpoint
+
+
+@contextmanager
+def inserting(session: Session):
+    """Hold the cube checkpoint while new customers are inserted.
+
+    Serial ids can commit out of order; without the lock a concurrent
+    ``catch_up`` could move the mark past ids that are not visible yet.
+    The caller commits.
+    """
+    if SUMMARY_CUBE_ENABLED:
+        _lock_checkpoint(session, shared=True)
+    yield
+
+
+def high_water(session: Session, lock: bool = False) -> int:
+    """Highest customer_id folded into the cube.
+
+    With ``lock`` the mark is held against catch-up until the session ends.
+    """
+    if lock:
+        return _lock_checkpoint(session, shared=True).last_customer_id
+    checkpoint = session.get(ScoringCheckpoint, CHECKPOINT_NAME)
+    return checkpoint.last_customer_id if checkpoint else 0
+
+
+def is_fresh(session: Session) -> bool:
+    checkpoint = session.get(ScoringCheckpoint, CHECKPOINT_NAME)
+    covered = checkpoint.last_customer_id if checkpoint else 0
+    if covered == STALE:
+        return False
+    newest = session.exec(select(func.max(Customer.customer_id))).one() or 0
+    return newest <= covered
+
+
+def catch_up(session: Session) -> int:
+    """Fold customers above the high-water mark into the cube and commit.
+
+    A stale cube is emptied and folded again from the first customer.
+    Returns the new high-water mark.
+    """
+    checkpoint = _lock_checkpoint(session)
+    covered = checkpoint.last_customer_id
+    if covered == STALE:
+        session.exec(delete(CustomerRollup))
+        covered = 0
+    newest = session.exec(select(func.max(Customer.customer_id))).one() or 0
+    if newest > covered:
+        _merge_from_customers(
+            session, and_(Customer.customer_id > covered, Customer.customer_id <= newest)
+        )
+    checkpoint.last_customer_id = max(newest, covered)
+    session.add(checkpoint)
+    session.commit()
+    return checkpoint.last_customer_id
+
+
+def ensure_fresh(session: Session):
+    if not is_fresh(session):
+        with Session(session.get_bind()) as maintenance:
+            catch_up(maintenance)
+
+
+def rebuild(session: Session):
+    """Drop the cube and rebuild it from ``customer``, in one transaction."""
+    checkpoint = _lock_checkpoint(session)
+    checkpoint.last_customer_id = STALE
+    session.add(checkpoint)
+    session.flush()
+    catch_up(session)
+
+
+def _stored_real(session: Session):
+    # Postgres keeps the probability as float4; fold in what a re-read returns
+    if session.get_bind().dialect.name == "postgresql":
+        return lambda value: struct.unpack("f", struct.pack("f", value))[0]
+    return float
+
+
+def record_scores(session: Session, customer_ids: Iterable[int], probabilities: Iterable[float]):
+    """Fold a probability write-back into the cube; call it before the write.
+
+    The rows' current scores are read once and the per-cell difference
+    goes out as one upsert, cells in key order, so concurrent writers
+    lock cells in the same order. Runs in the caller's transaction; the
+    caller commits.
+    """
+    customer_ids = list(customer_ids)
+    if not customer_ids:
+        return
+    if not SUMMARY_CUBE_ENABLED:
+        # Nobody maintains the cube now; if these rows are in it, make the
+        # next catch-up after re-enabling start over
+        session.connection().execute(
+            update(ScoringCheckpoint)
+            .where(
+                ScoringCheckpoint.name == CHECKPOINT_NAME,
+                ScoringCheckpoint.last_customer_id >= min(customer_ids),
+            )
+            .values(last_customer_id=STALE)
+        )
+        return
+
+    covered = _lock_checkpoint(session, shared=True).last_customer_id
+    # Rows above the mark are not in the cube yet; catch_up counts them later
+    new_scores = {
+        customer_id: probability
+        for customer_id, probability in zip(customer_ids, probabilities)
+        if customer_id <= covered
+    }
+    if not new_scores:
+        return
+    stored = _stored_real(session)
+    rows = session.connection().execute(
+        select(
+            Customer.customer_id,
+            Customer.job,
+            Customer.marital_status,
+            Customer.education,
+            Customer.age,
+            Customer.last_contact_weekday,
+            Customer.last_contact_month,
+            Customer.subscription_probability,
+        ).where(Customer.customer_id.in_(list(new_scores)))
+    ).all()
+
+    deltas = defaultdict(lambda: [0, 0, 0, 0.0, 0])
+    for customer_id, job, marital_status, education, age, weekday, month, old in rows:
+        new = _score_measures(stored(new_scores[customer_id]))
+        old = _score_measures(old)
+        age_bin = age // AGE_BIN * AGE_BIN
+        for dimension, value in (("weekday", weekday), ("month", month)):
+            cell = deltas[(job, marital_status, education, age_bin, dimension, value)]
+            for i in range(len(cell)):
+                cell[i] += new[i] - old[i]
+    changed = [
+        {**dict(zip(KEY, key)), "row_count": 0, **dict(zip(MEASURES[1:], cell))}
+        for key, cell in sorted(deltas.items())
+        if any(cell)
+    ]
+    if changed:
+        session.connection().execute(_upsert(_insert(session)), changed)
+
+
+def filter_conditions(
+    name: Optional[str] = None,
+    job: Optional[str] = None,
+    marital_status: Optional[str] = None,
+    education: Optional[str] = None,
+    min_age: Optional[int] = None,
+    max_age: Optional[int] = None,
+) -> Optional[List]:
+    """Cube conditions matching the dashboard filters, or None if only the
+    base table can answer them.
+
+    The cube has no name column, and it only knows whole age bins, so
+    ``min_age`` must start a bin and ``max_age`` must end one.
+    """
+    if not SUMMARY_CUBE_ENABLED or name:
+        return None
+    if min_age is not None and min_age % AGE_BIN:
+        return None
+    if max_age is not None and (max_age + 1) % AGE_BIN:
+        return None
+    conditions = []
+    if job:
+        conditions.append(CustomerRollup.job.icontains(job))
+    if marital_status:
+        conditions.append(CustomerRollup.marital_status == marital_status)
+    if education:
+        conditions.append(CustomerRollup.education == education)
+    if min_age is not None:
+        conditions.append(CustomerRollup.age_bin >= min_age)
+    if max_age is not None:
+        conditions.append(CustomerRollup.age_bin <= max_age + 1 - AGE_BIN)
+    return conditions
+
+
+def _sum(column):
+    # SUM over BIGINT is NUMERIC on Postgres, which drivers return as Decimal
+    return cast(func.coalesce(func.sum(column), 0), column.type)
+
+
+def count_query(filters: list):
+    return select(_sum(CustomerRollup.row_count)).where(CustomerRollup.dimension == "weekday", *filters)
+
+
+def chart_query(filters: list):
+    """Cube equivalent of the base-table chart aggregate, same row shape.
+
+    Returns the grouping sets main._chart_query computes on Postgres: job
+    by age bin (both charts), everything (the distribution), weekday and
+    month.
+    """
+    # One pass over the cells; the grouping sets below read the (much
+    # smaller) per job, age bin and weekday/month groups
+    table = CustomerRollup
+    cells = (
+        select(
+            table.job,
+            table.age_bin,
+            table.dimension,
+            table.value,
+            *(func.sum(getattr(table, name)).label(name) for name in MEASURES[1:]),
+        )
+        .where(table.prob_count > 0, *filters)
+        .group_by(table.job, table.age_bin, table.dimension, table.value)
+        .cte("cells")
+    )
+    measures = (
+        _sum(cells.c.high_count),
+        _sum(cells.c.medium_count),
+        _sum(cells.c.low_count),
+        _sum(cells.c.prob_sum),
+        _sum(cells.c.prob_count),
+    )
+    weekday_cells = cells.c.dimension == "weekday"
+    return union_all(
+        select(
+            cells.c.job, cells.c.age_bin, null(), null(),
+            literal(GROUPED_OUT_WEEKDAY | GROUPED_OUT_MONTH), *measures,
+        ).where(weekday_cells).group_by(cells.c.job, cells.c.age_bin),
+        select(
+            null(), null(), null(), null(), literal(GROUPED_OUT_ALL), *measures,
+        ).where(weekday_cells),
+        select(
+            null(), null(), cells.c.value, null(),
+            literal(GROUPED_OUT_JOB | GROUPED_OUT_AGE | GROUPED_OUT_MONTH), *measures,
+        ).where(weekday_cells).group_by(cells.c.value),
+        select(
+            null(), null(), null(), cells.c.value,
+            literal(GROUPED_OUT_JOB | GROUPED_OUT_AGE | GROUPED_OUT_WEEKDAY), *measures,
+        ).where(cells.c.dimension == "month").group_by(cells.c.value),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="Maintain the dashboard summary cube")
+    parser.add_argument("command", choices=["rebuild", "catch-up", "check"])
+    args = parser.parse_args()
+
+    with Session(engine) as session:
+        if args.command == "rebuild":
+            rebuild(session)
+            print("Summary cube rebuilt.")
+        elif args.command == "check":
+            # Cube answers must match the base table on this database's
+            # driver, Decimal/float quirks included
+            from main import _chart_query, _count_query, _rollup_chart_rows
+
+            ensure_fresh(session)
+            dialect_name = session.get_bind().dialect.name
+            base = (
+                session.exec(_count_query([])).one(),
+                _rollup_chart_rows(session.exec(_chart_query([], dialect_name)).all()),
+            )
+            cube = (
+                session.exec(count_query([])).one(),
+                _rollup_chart_rows(session.exec(chart_query([])).all()),
+            )
+            if base != cube:
+                raise SystemExit(f"Summary cube differs from customer:\n  base {base}\n  cube {cube}")
+            print("Summary cube matches customer.")
+        else:
+            print(f"Summary cube covers customers up to id {catch_up(session)}.")
@@ -0,0 +1,87 @@
+import os
+import sys
+import tempfile
+
+# The app reads its settings at import time, so point it at a scratch
+# SQLite database before anything imports database.py
+_db_dir = tempfile.mkdtemp(prefix="bank-leads-tests-")
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_db_dir, 'test.db')}",
+    SALES_PASSWORD="test-password",
+    ENV="development",
+    MODEL_WARMUP="off",
+    ASYNC_DB="0",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlmodel import Session
+
+import main
+import summary_cube
+from cache import bump_dataset_version
+from models import Customer, LeadClaim
+
+JOBS = ["admin.", "technician", "services", "management"]
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri"]
+
+
+def make_customer(i: int, probability) -> Customer:
+    return Customer(
+        customer_id=i,
+        name=f"Customer {i}",
+        phone_number=f"+351{i:09d}",
+        age=20 + i % 50,
+        job=JOBS[i % len(JOBS)],
+        marital_status="married" if i % 2 else "single",
+        education="university.degree",
+        has_default_credit="no",
+        has_housing_loan="yes",
+        has_personal_loan="no",
+        contact_method="cellular",
+        last_contact_month="may",
+        last_contact_weekday=WEEKDAYS[i % len(WEEKDAYS)],
+        last_call_duration_sec=100 + i,
+        current_campaign_contacts=1,
+        days_since_last_campaign=999,
+        previous_campaign_contacts=0,
+        previous_campaign_outcome="nonexistent",
+        employment_variation_rate=1.1,
+        consumer_price_index=93.994,
+        consumer_confidence_index=-36.4,
+        euribor_3m_rate=4.857,
+        number_of_employed=5191.0,
+        subscription_probability=probability,
+    )
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def load_customers(client):
+    """Replace every customer (and lead claim) with the given probabilities."""
+
+    def load(probabilities):
+        with Session(main.engine) as session:
+            session.exec(delete(LeadClaim))
+            session.exec(delete(Customer))
+            session.add_all(make_customer(i, p) for i, p in enumerate(probabilities, start=1))
+            session.commit()
+            summary_cube.rebuild(session)
+        bump_dataset_version()
+
+    return load
+
+
+@pytest.fixture(scope="session")
+def auth_headers(client):
+    token = client.post(
+        "/token", data={"username": "sales_a", "password": "test-password"}
+    ).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,47 @@
+import pytest
+
+
+def _offset_pages(client, headers, page_size):
+    items, page = [], 1
+    while True:
+        body = client.get("/", params={"page": page, "page_size": page_size}, headers=headers).json()
+        items += body["items"]
+        if page >= body["total_pages"]:
+            return items
+        page += 1
+
+
+def _cursor_pages(client, headers, page_size):
+    items, cursor = [], None
+    while True:
+        params = {"page_size": page_size}
+        if cursor:
+            params["cursor"] = cursor
+        body = client.get("/", params=params, headers=headers).json()
+        items += body["items"]
+        cursor = body["next_cursor"]
+        if not cursor:
+            return items
+
+
+@pytest.mark.parametrize(
+    "probability",
+    [
+        # Unrounded probabilities, with some NULLs (never scored)
+        lambda i: None if i % 11 == 0 else (i * 37 % 1000) / 10 + 0.000123456,
+        # Long runs of ties, broken only by customer_id
+        lambda i: None if i % 11 == 0 else float(i % 5 * 10),
+    ],
+    ids=["unrounded", "ties"],
+)
+def test_cursor_walk_matches_offset_paging(client, auth_headers, load_customers, probability):
+    load_customers([probability(i) for i in range(1, 301)])
+
+    by_offset = _offset_pages(client, auth_headers, page_size=37)
+    by_cursor = _cursor_pages(client, auth_headers, page_size=37)
+
+    assert len(by_offset) == 300
+    assert by_cursor == by_offset
+    assert len({item["customer_id"] for item in by_cursor}) == 300
+    # Unscored customers rank last
+    assert all(item["subscription_probability"] is None for item in by_cursor[-27:])
@@ -0,0 +1,49 @@
+import threading
+
+from sqlmodel import Session, select
+
+import lead_queue
+import main
+from models import User
+
+
+def _users(count, prefix):
+    with Session(main.engine) as session:
+        session.add_all(User(username=f"{prefix}{i}", password="unused") for i in range(count))
+        session.commit()
+        return session.exec(select(User.user_id).where(User.username.like(f"{prefix}%"))).all()
+
+
+def test_concurrent_claimers_get_distinct_leads(load_customers):
+    load_customers([float(i % 7) for i in range(1, 101)])
+    user_ids = _users(40, "claimer-")
+
+    claimed = []
+
+    def claim(user_id):
+        with Session(main.engine) as session:
+            claim = lead_queue.claim_next_lead(session, user_id)
+            claimed.append(claim.customer_id if claim else None)
+
+    threads = [threading.Thread(target=claim, args=(user_id,)) for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert None not in claimed
+    assert len(claimed) == 40
+    assert len(set(claimed)) == 40
+
+
+def test_completed_leads_are_not_handed_out_again(load_customers):
+    load_customers([90.0, 80.0, 70.0])
+    first, second = _users(2, "closer-")
+
+    with Session(main.engine) as session:
+        assert lead_queue.claim_next_lead(session, first).customer_id == 1
+        assert lead_queue.complete_lead(session, first, 1, "subscribed") is not None
+        assert lead_queue.claim_next_lead(session, second).customer_id == 2
+        assert lead_queue.claim_next_lead(session, first).customer_id == 3
+        assert lead_queue.release_lead(session, first, 3)
+        assert lead_queue.claim_next_lead(session, first).customer_id == 3